@@ -0,0 +1,79 @@
+"""
+Release/paste latency of collision resolution at several board sizes.
+
+Run from the repository root:
+    python -m benchmarks.bench_collisions
+"""
+import contextlib
+import io
+import random
+import statistics
+import time
+
+from PIL import Image
+
+from plot_collage.collage_canvas import CollageCanvas
+from plot_collage.image_item import ImageItem
+
+SIZES = (100, 1000, 5000)
+REPEATS = 20
+
+
+def make_board(n, rng):
+    # Headless board with n plot-sized images laid out on a loose grid
+    board = CollageCanvas(None)
+    cols = int(n ** 0.5) + 1
+    for i in range(n):
+        w, h = rng.randint(300, 800), rng.randint(200, 600)
+        pos = ((i % cols) * 900 + 450, (i // cols) * 700 + 350)
+        # Mode "1" keeps the pixel buffers tiny; only the geometry matters here
+        item = ImageItem(Image.new("1", (w, h)), pos, i, None, board.geometry)
+        board.images.append(item)
+    timed_resolve(board)
+    return board
+
+
+def timed_resolve(board, img=None):
+    # The nudge placement prints a warning when it gives up; keep the table readable
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        board.resolve_collisions(img)
+        return time.perf_counter() - start
+
+
+def time_paste(board, rng):
+    # Paste at a random spot, then take the item off again so every run sees the same board
+    x1, y1 = board.get_total_bbox()[2:]
+    pos = (rng.uniform(0, x1), rng.uniform(0, y1))
+    item = ImageItem(Image.new("1", (rng.randint(300, 800), rng.randint(200, 600))), pos, len(board.images), None, board.geometry)
+    board.images.append(item)
+    elapsed = timed_resolve(board, item)
+    board.images.remove(item)
+    board.geometry.remove(item)
+    return elapsed
+
+
+def time_release(board, rng):
+    # Drop a random item somewhere else, then restore the layout
+    x1, y1 = board.get_total_bbox()[2:]
+    saved = [img.pos for img in board.images]
+    img = rng.choice(board.images)
+    img.pos = (rng.uniform(0, x1), rng.uniform(0, y1))
+    elapsed = timed_resolve(board)
+    for img, pos in zip(board.images, saved):
+        img.pos = pos
+    return elapsed
+
+
+def main():
+    rng = random.Random(0)
+    print(f"{'items':>6} {'paste ms (median)':>18} {'release ms (median)':>20} {'collision free':>15}")
+    for n in SIZES:
+        board = make_board(n, rng)
+        paste = [time_paste(board, rng) for _ in range(REPEATS)]
+        release = [time_release(board, rng) for _ in range(REPEATS)]
+        print(f"{n:>6} {statistics.median(paste) * 1e3:>18.2f} {statistics.median(release) * 1e3:>20.2f} {str(board.check_collision_free()):>15}")
+
+
+if __name__ == "__main__":
+    main()
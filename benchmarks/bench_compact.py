@@ -0,0 +1,70 @@
+"""
+Pixel memory and export compositing with and without compact ingest
+(source.compact: opaque alpha dropped, flat-colored plots stored as palette
+images). Half the plots are RGBA, as matplotlib's savefig writes them.
+
+Run from the repository root:
+    python -m benchmarks.bench_compact [--plots 24]
+"""
+import argparse
+import hashlib
+import time
+
+from benchmarks.synthetic import make_plot
+from plot_collage import source as source_module
+from plot_collage.collage_canvas import CollageCanvas
+from plot_collage.export import collect_layers, iter_strips, snapshot
+from plot_collage.image_item import ImageItem
+from plot_collage.render_cache import CACHE, BASE_SCALE, zoom_level
+from plot_collage.source import IMAGES
+
+
+def run(plots, compact):
+    source_module.COMPACT_PIXELS = compact
+    CACHE.clear()
+    start = time.perf_counter()
+    sources = [IMAGES.intern(plot) for plot in plots]
+    ingest = time.perf_counter() - start
+    board = CollageCanvas(None)
+    w, h = plots[0].size
+    for i, source in enumerate(sources):
+        board.images.append(ImageItem(source, (w * (i % 6) + w // 2, h * (i // 6) + h // 2), i, None, board.geometry))
+    full = sum(source.nbytes for source in sources)
+    proxies = sum(source.proxy.width * source.proxy.height * len(source.proxy.getbands()) for source in sources)
+    modes = sorted({source.mode for source in sources})
+
+    layers, size = collect_layers(snapshot(board.images))
+    digest = hashlib.blake2b()
+    start = time.perf_counter()
+    for strip in iter_strips(layers, size):
+        digest.update(strip.tobytes())
+    composite = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for source in sources:
+        CACHE.resized(source, zoom_level(BASE_SCALE))
+    render = time.perf_counter() - start
+    for img in board.images:
+        img.delete()
+    return ingest, full, proxies, modes, composite, render, digest.hexdigest()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--plots", type=int, default=24)
+    args = parser.parse_args()
+    plots = [make_plot(seed, alpha=seed % 2 == 0) for seed in range(args.plots)]
+    print(f"{'ingest':<9}{'modes':<14}{'full MiB':>9}{'proxy MiB':>10}{'ingest s':>9}{'composite s':>12}{'render s':>9}")
+    results = {}
+    for compact in (False, True):
+        ingest, full, proxies, modes, composite, render, digest = run(plots, compact)
+        results[compact] = (full, composite, digest)
+        label = "compact" if compact else "as-is"
+        print(f"{label:<9}{','.join(modes):<14}{full / 2**20:>9.1f}{proxies / 2**20:>10.1f}{ingest:>9.2f}{composite:>12.2f}{render:>9.2f}")
+    print(f"full-resolution pixels {results[False][0] / results[True][0]:.1f}x smaller, "
+          f"compositing {results[False][1] / results[True][1]:.1f}x faster, "
+          f"identical export: {results[False][2] == results[True][2]}")
+
+
+if __name__ == "__main__":
+    main()
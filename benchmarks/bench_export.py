@@ -0,0 +1,98 @@
+"""
+Peak memory and time of collage export: one full-size canvas (the previous
+implementation) versus strip-by-strip composition with a streaming PNG encoder.
+
+Run from the repository root:
+    python -m benchmarks.bench_export
+"""
+import io
+import multiprocessing
+import random
+import resource
+import time
+
+from PIL import Image
+
+from plot_collage.collage_canvas import CollageCanvas
+from plot_collage.export import collect_layers, snapshot, write_collage_png
+from plot_collage.image_item import ImageItem
+
+# (label, number of plots, board side in logical pixels)
+LAYOUTS = (
+    ("dense 16 plots", 16, 5000),
+    ("sparse 16 plots", 16, 14000),
+)
+PLOT_SIZE = (1600, 1200)
+
+
+class CountingSink:
+    # Stands in for the xclip pipe: counts bytes without keeping them
+    def __init__(self):
+        self.size = 0
+
+    def write(self, data):
+        self.size += len(data)
+
+
+def make_board(n, side):
+    rng = random.Random(0)
+    board = CollageCanvas(None)
+    plot = Image.linear_gradient("L").resize(PLOT_SIZE).convert("RGBA")
+    for i in range(n):
+        pos = (rng.uniform(PLOT_SIZE[0], side), rng.uniform(PLOT_SIZE[1], side))
+        board.images.append(ImageItem(plot, pos, i, None, board.geometry))
+    return board
+
+
+def export_full(board):
+    # The previous copy_collage_to_clipboard: one RGBA canvas for the whole bbox, encoded at once
+    min_x, min_y, max_x, max_y = board.get_total_bbox()
+    collage = Image.new("RGBA", (int(max_x - min_x), int(max_y - min_y)), (255, 255, 255, 0))
+    for img in board.images:
+        x, y = img.pos
+        pil = img.source.full()
+        offset_x = int(x - pil.width // 2 - min_x)
+        offset_y = int(y - pil.height // 2 - min_y)
+        collage.paste(pil, (offset_x, offset_y), pil if pil.mode == 'RGBA' else None)
+    output = io.BytesIO()
+    collage.save(output, "PNG")
+    return len(output.getvalue())
+
+
+def export_strips(board):
+    sink = CountingSink()
+    layers, size = collect_layers(snapshot(board.images))
+    write_collage_png(layers, size, sink)
+    return sink.size
+
+
+def run(name, n, side, queue):
+    board = make_board(n, side)
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    size = {"full": export_full, "strips": export_strips}[name](board)
+    elapsed = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - before
+    queue.put((elapsed, peak / 1024, size / 2**20))
+
+
+def measure(name, n, side):
+    # Fresh process per run so ru_maxrss reflects only this export
+    queue = multiprocessing.Queue()
+    proc = multiprocessing.Process(target=run, args=(name, n, side, queue))
+    proc.start()
+    result = queue.get()
+    proc.join()
+    return result
+
+
+def main():
+    print(f"{'layout':<18} {'engine':<7} {'time s':>8} {'peak +MiB':>10} {'png MiB':>8}")
+    for label, n, side in LAYOUTS:
+        for name in ("full", "strips"):
+            elapsed, peak, size = measure(name, n, side)
+            print(f"{label:<18} {name:<7} {elapsed:>8.2f} {peak:>10.0f} {size:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Placement time and wasted area: the previous nudge-based collision resolution
+versus the packing layout engine (place-near-point and skyline auto-arrange).
+
+Run from the repository root:
+    python -m benchmarks.bench_layout
+"""
+import contextlib
+import io
+import random
+import time
+
+from PIL import Image
+
+from plot_collage.collage_canvas import CollageCanvas
+from plot_collage.image_item import ImageItem
+from plot_collage.source import ImageSource
+from plot_collage.spatial_index import rects_overlap
+
+PASTE_SIZES = (100, 200)  # every paste lands in the same spot, so the board is one dense blob
+ARRANGE_SIZES = (100, 1000, 5000)
+
+
+def legacy_find_non_overlapping_position(item, intended_pos, other):
+    # The previous CollageCanvas.find_non_overlapping_position
+    x0, y0 = intended_pos
+    best_pos = intended_pos
+    min_dist = float('inf')
+    bbox0 = item.get_bbox_at((x0, y0))
+    for direction in ['right', 'left', 'down', 'up']:
+        bbox1 = other.get_bbox()
+        if not rects_overlap(bbox0, bbox1):
+            continue
+        if direction == 'right':
+            step = bbox1[2] - bbox0[0]
+            new_x, new_y = x0 + step, y0
+        elif direction == 'left':
+            step = bbox0[2] - bbox1[0]
+            new_x, new_y = x0 - step, y0
+        elif direction == 'down':
+            step = bbox1[3] - bbox0[1]
+            new_x, new_y = x0, y0 + step
+        else:
+            step = bbox0[3] - bbox1[1]
+            new_x, new_y = x0, y0 - step
+        if not (new_x >= 0 and new_y >= 0):
+            continue
+        if step > 0:
+            dist = abs(new_x - x0) + abs(new_y - y0)
+            if dist <= min_dist:
+                min_dist = dist
+                best_pos = (new_x, new_y)
+    return best_pos
+
+
+def legacy_resolve(images, img):
+    # The previous resolve_collisions for a freshly pasted image (moved to the end of the list)
+    for i in range(len(images)):
+        cur = images[i]
+        bbox = cur.get_bbox()
+        if not (bbox[0] >= 0 and bbox[1] >= 0):
+            cur.pos = (cur.pos[0] - min(0, bbox[0]), cur.pos[1] - min(0, bbox[1]))
+        attempts = 0
+        while i > 0 and attempts < 50:
+            other = next((o for o in images[:i] if rects_overlap(cur.get_bbox(), o.get_bbox())), None)
+            if other is None:
+                break
+            pos = legacy_find_non_overlapping_position(cur, cur.pos, other)
+            if pos == cur.pos:
+                break
+            cur.pos = pos
+            attempts += 1
+
+
+def plot_sizes(n, seed=0):
+    rng = random.Random(seed)
+    return [(rng.randint(300, 800), rng.randint(200, 600)) for _ in range(n)]
+
+
+def make_item(board, size, pos, i):
+    source = ImageSource(Image.new("1", size), proxy_scale=None, spill=False)
+    return ImageItem(source, pos, i, None, board.geometry)
+
+
+def paste_sequence(n, legacy):
+    # Paste n plots one after another around the same cursor spot
+    board = CollageCanvas(None)
+    rng = random.Random(1)
+    start = time.perf_counter()
+    for i, size in enumerate(plot_sizes(n)):
+        item = make_item(board, size, (2000 + rng.uniform(-300, 300), 2000 + rng.uniform(-300, 300)), i)
+        board.images.append(item)
+        if legacy:
+            legacy_resolve(board.images, item)
+        else:
+            board.resolve_collisions(item)
+    return board, time.perf_counter() - start
+
+
+def auto_arrange(n):
+    board = CollageCanvas(None)
+    for i, size in enumerate(plot_sizes(n)):
+        board.images.append(make_item(board, size, (0, 0), i))
+    start = time.perf_counter()
+    board.auto_arrange()
+    return board, time.perf_counter() - start
+
+
+def stats(board):
+    x0, y0, x1, y1 = board.get_total_bbox()
+    used = sum(w * h for w, h in (img.size for img in board.images))
+    overlaps = sum(1 for img in board.images for other in board.geometry.query(img.get_bbox()) if other is not img) // 2
+    return 1 - used / ((x1 - x0) * (y1 - y0)), overlaps
+
+
+def main():
+    print(f"{'items':>6} {'method':<22} {'time s':>8} {'wasted area':>12} {'overlaps':>9}")
+    runs = []
+    for n in PASTE_SIZES:
+        runs.append((n, "nudge paste (previous)", lambda n=n: paste_sequence(n, legacy=True)))
+        runs.append((n, "place-near paste", lambda n=n: paste_sequence(n, legacy=False)))
+    for n in ARRANGE_SIZES:
+        runs.append((n, "skyline auto-arrange", lambda n=n: auto_arrange(n)))
+    for n, name, run in runs:
+        with contextlib.redirect_stdout(io.StringIO()):
+            board, elapsed = run()
+        wasted, overlaps = stats(board)
+        # Wasted area is meaningless once plots overlap
+        wasted = f"{wasted:.1%}" if not overlaps else "-"
+        print(f"{n:>6} {name:<22} {elapsed:>8.3f} {wasted:>12} {overlaps:>9}")
+
+
+if __name__ == "__main__":
+    main()
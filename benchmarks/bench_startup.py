@@ -0,0 +1,67 @@
+"""
+Start-up time of `plot-collage add FILE` when a board is already running
+(the client only forwards the path over the instance socket) compared
+with a bare interpreter and with what a new board has to import before
+its window can appear.
+
+Run from the repository root:
+    python -m benchmarks.bench_startup [--runs 20]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.synthetic import plot_png
+from plot_collage.instance import SOCKET_ENV
+from plot_collage.server import InstanceServer
+
+
+def wall_ms(cmd, env, runs):
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(cmd, env=env, check=True, stdout=subprocess.DEVNULL)
+        times.append((time.perf_counter() - start) * 1e3)
+    return statistics.median(times), min(times)
+
+
+def imported_modules(cmd, env):
+    result = subprocess.run([cmd[0], "-X", "importtime", *cmd[1:]], env=env, check=True, capture_output=True, text=True)
+    return sum(line.startswith("import time:") for line in result.stderr.splitlines()) - 1  # minus the header
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+    directory = tempfile.mkdtemp(prefix="plot-collage-startup-")
+    plot = os.path.join(directory, "plot.png")
+    with open(plot, "wb") as f:
+        f.write(plot_png(0))
+    env = dict(os.environ, **{SOCKET_ENV: os.path.join(directory, "socket")})
+    server = InstanceServer(env[SOCKET_ENV])
+    server.start()
+    cases = (
+        ("python -c pass", [sys.executable, "-c", "pass"]),
+        # What the installed `plot-collage` entry point runs
+        ("client: add FILE", [sys.executable, "-c", "import sys; from plot_collage.main import main; sys.exit(main())", "add", plot]),
+        ("new board imports", [sys.executable, "-c", "import plot_collage.collage_canvas, plot_collage.main"]),
+    )
+    print(f"{'case':<20}{'median ms':>11}{'min ms':>9}{'modules':>9}")
+    for label, cmd in cases:
+        median, best = wall_ms(cmd, env, args.runs)
+        print(f"{label:<20}{median:>11.1f}{best:>9.1f}{imported_modules(cmd, env):>9}")
+    received = 0
+    while not server.requests.empty():
+        server.requests.get()
+        received += 1
+    server.stop()
+    print(f"requests received by the running board: {received}")
+
+
+if __name__ == "__main__":
+    main()
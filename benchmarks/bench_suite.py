@@ -0,0 +1,197 @@
+"""
+Interactive hot paths on a board rendered into the in-memory RecordingCanvas:
+mass paste (through the async clipboard pipeline), zoom sweeps, image drags,
+panning and export, at several board sizes, plus zooming into a single 8K plot. Prints latency percentiles and
+memory; --json writes the same numbers for CI regression checks.
+
+Run from the repository root:
+    python -m benchmarks.bench_suite [--sizes 20 100 300] [--json out.json] [--trace trace.json]
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import time
+
+from plot_collage import image_item
+from plot_collage.backend import RecordingCanvas
+from plot_collage.collage_canvas import DRAG_FRAME_MS, CollageCanvas
+from plot_collage.image_item import ImageItem
+from plot_collage.instrument import TRACER
+from plot_collage.render_cache import CACHE
+from plot_collage.source import IMAGES
+
+from .synthetic import make_plot, plot_png
+
+SIZES = (20, 100, 300)
+VARIANTS = 8  # distinct synthetic plots, cycled through
+LARGE_PLOT = (8192, 6144)
+DEEP_ZOOM_TICKS = 22  # from the base scale of 0.25 to about 2x
+
+
+class Event:
+    def __init__(self, x, y):
+        self.x = x
+        self.y = y
+
+
+class FakeClipboard:
+    available = True
+
+    def __init__(self, pngs):
+        self.pngs = pngs
+        self.next = 0
+
+    def targets(self):
+        return ["TARGETS", "image/png"]
+
+    def read(self, target):
+        data = self.pngs[self.next % len(self.pngs)]
+        self.next += 1
+        return data
+
+
+def rss_mib():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    pick = lambda q: samples[min(len(samples) - 1, int(q * len(samples)))] * 1e3
+    return {"p50": pick(0.5), "p95": pick(0.95), "max": samples[-1] * 1e3, "n": len(samples)}
+
+
+def run_board(n, pngs, composite_threshold=None):
+    results = {}
+    backend = RecordingCanvas()
+    board = CollageCanvas(None, clipboard=FakeClipboard(pngs), backend=backend)
+    board.deliver_export = None
+    if composite_threshold is not None:
+        board.composite_threshold = composite_threshold
+
+    # Mass paste: handler latency on the Tk thread, then the time until every image arrived
+    paste = []
+    start = time.perf_counter()
+    for i in range(n):
+        paste.append(timed(board.paste_clipboard_image, Event(600, 600)))
+    backend.run_until_idle()
+    results["paste handler"] = percentiles(paste)
+    results["paste total s"] = time.perf_counter() - start
+
+    # Zoom sweep: out and back in, handler latency per wheel tick, then the deferred refine
+    zoom = [timed(board.zoomerM, None) for _ in range(8)] + [timed(board.zoomerP, None) for _ in range(8)]
+    results["zoom tick"] = percentiles(zoom)
+    results["zoom refine s"] = timed(backend.run_until_idle)
+
+    # Drag the first image across the window: motion handlers plus one flush per frame
+    img = board.images[0]
+    x, y = img.pos[0] * board.current_scale - backend.view[0], img.pos[1] * board.current_scale - backend.view[1]
+    board.on_image_press(Event(x, y))
+    drag = []
+    for step in range(60):
+        t = timed(board.on_image_drag, Event(x + step * 5, y + step * 3))
+        t += timed(backend.run_pending, DRAG_FRAME_MS)
+        drag.append(t)
+    results["drag frame"] = percentiles(drag)
+    results["drag release"] = percentiles([timed(board.on_image_release, Event(x + 300, y + 180))])
+
+    # Pan across the board
+    board.start_drag(Event(0, 0))
+    results["pan step"] = percentiles([timed(board.drag, Event(-step * 40, -step * 40)) for step in range(40)])
+
+    # Export at full resolution and at the current zoom
+    for scale in ("full", "view"):
+        start = time.perf_counter()
+        board.copy_collage_to_clipboard(scale=scale)
+        backend.run_until_idle(timeout=600)
+        results[f"export {scale} s"] = time.perf_counter() - start
+
+    results["photo upload MiB"] = backend.photo_bytes / 2**20
+    results["canvas calls"] = sum(backend.calls.values())
+    results["render cache MiB"] = CACHE.used / 2**20
+    results["dedup saved MiB"] = IMAGES.stats()[2] / 2**20
+    results["rss MiB"] = rss_mib()
+    board.close()
+    CACHE.clear()
+    return results
+
+
+def run_deep_zoom(plot, roi=True):
+    # Zoom into the middle of one huge plot and pan around it, with or without region rendering
+    saved = image_item.ROI_MIN_PIXELS
+    if not roi:
+        image_item.ROI_MIN_PIXELS = float("inf")
+    try:
+        results = {}
+        backend = RecordingCanvas()
+        board = CollageCanvas(None, clipboard=FakeClipboard([]), backend=backend)
+        board.images.append(ImageItem(plot, (plot.width // 2, plot.height // 2), 0, backend, board.geometry, board.pool))
+        board.rerender_images()
+        zoom = []
+        for _ in range(DEEP_ZOOM_TICKS):
+            # Keep the plot's center in the middle of the window, like wheel-zooming at the cursor
+            zoom.append(timed(board.zoomerP, None))
+            cx, cy = board.images[0].pos[0] * board.current_scale, board.images[0].pos[1] * board.current_scale
+            backend.view = (cx - backend.width / 2, cy - backend.height / 2)
+        results["zoom tick"] = percentiles(zoom)
+        results["zoom refine s"] = timed(backend.run_until_idle)
+        board.start_drag(Event(0, 0))
+        results["pan step"] = percentiles([timed(board.drag, Event(-step * 40, -step * 25)) for step in range(40)])
+        results["largest photo MiB"] = max(item["options"]["image"].nbytes() for item in backend.visible_items("image")) / 2**20
+        results["photo upload MiB"] = backend.photo_bytes / 2**20
+        results["rss MiB"] = rss_mib()
+        board.close()
+        CACHE.clear()
+        return results
+    finally:
+        image_item.ROI_MIN_PIXELS = saved
+
+
+def print_results(title, results):
+    print(f"== {title}")
+    for name, value in results.items():
+        if isinstance(value, dict):
+            print(f"  {name:<18} p50 {value['p50']:8.2f} ms  p95 {value['p95']:8.2f} ms  max {value['max']:8.2f} ms  (n={value['n']})")
+        else:
+            print(f"  {name:<18} {value:10.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+    parser.add_argument("--json", help="also write the results to this file")
+    parser.add_argument("--trace", help="record hot-path spans and write a Chrome trace to this file")
+    parser.add_argument("--composite-threshold", type=int, help="item count from which boards render as one composited bitmap")
+    args = parser.parse_args()
+    TRACER.enabled = bool(args.trace)
+    pngs = [plot_png(seed) for seed in range(VARIANTS)]
+    report = {}
+    for n in args.sizes:
+        with contextlib.redirect_stdout(io.StringIO()):
+            results = run_board(n, pngs, args.composite_threshold)
+        report[n] = results
+        print_results(f"{n} images", results)
+    plot = make_plot(0, LARGE_PLOT)
+    for roi in (False, True):
+        name = f"deep zoom {'region' if roi else 'whole'}"
+        with contextlib.redirect_stdout(io.StringIO()):
+            report[name] = run_deep_zoom(plot, roi)
+        print_results(f"{name} ({LARGE_PLOT[0]}x{LARGE_PLOT[1]})", report[name])
+    if args.trace:
+        TRACER.dump(args.trace)
+        print(TRACER.summary())
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Watch-folder ingestion: how long a burst of plot files takes to reach the
+board and how long the Tk loop is blocked meanwhile (longest poll_watch
+callback), then the cost of one rewritten file being swapped in place.
+
+Run from the repository root:
+    python -m benchmarks.bench_watch [--files 300]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from benchmarks.bench_suite import FakeClipboard
+from benchmarks.synthetic import plot_png
+from plot_collage.backend import RecordingCanvas
+from plot_collage.collage_canvas import CollageCanvas
+from plot_collage.instrument import TRACER
+
+DISTINCT_PLOTS = 40
+
+
+def pump(board, seconds):
+    # Stand-in for the Tk main loop: run due callbacks in real time
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        board.canvas.run_pending(10)
+        time.sleep(0.005)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--files", type=int, default=300)
+    args = parser.parse_args()
+    pngs = [plot_png(i) for i in range(DISTINCT_PLOTS)]
+    directory = tempfile.mkdtemp(prefix="plot-collage-watch-")
+    for i in range(args.files):
+        with open(os.path.join(directory, f"plot{i:04}.png"), "wb") as f:
+            f.write(pngs[i % DISTINCT_PLOTS])
+    board = CollageCanvas(None, clipboard=FakeClipboard(pngs), backend=RecordingCanvas())
+    TRACER.enabled = True
+    start = time.monotonic()
+    board.watch(directory)
+    board.watcher.interval = 0.1
+    while len(board.images) < args.files:
+        pump(board, 0.05)
+    elapsed = time.monotonic() - start
+    count, total, peak, _ = TRACER.stats["poll_watch"]
+    print(f"{args.files} files on the board in {elapsed:.1f} s, collision free: {board.check_collision_free()}")
+    print(f"poll_watch: {count} callbacks, {total * 1e3:.0f} ms total, longest {peak * 1e3:.1f} ms")
+
+    path, item = next((p, i) for p, i in board.watched.items() if i.rendered_at is not None or board.composited)
+    TRACER.reset()
+    with open(path, "wb") as f:
+        f.write(plot_png(DISTINCT_PLOTS))
+    start = time.monotonic()
+    source = item.source
+    while item.source is source:
+        pump(board, 0.01)
+    print(f"rewritten file swapped in {time.monotonic() - start:.2f} s (scan and settle included), "
+          f"poll_watch {TRACER.stats['poll_watch'][2] * 1e3:.1f} ms, {len(board.images)} items")
+    board.close()
+
+
+if __name__ == "__main__":
+    main()
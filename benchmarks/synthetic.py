@@ -0,0 +1,42 @@
+"""Synthetic matplotlib-like plot images for the benchmarks."""
+import io
+import math
+import random
+
+from PIL import Image, ImageDraw
+
+PLOT_SIZE = (1280, 960)  # matplotlib's default 6.4x4.8 in figure at 200 dpi
+LINE_COLORS = ((31, 119, 180), (255, 127, 14), (44, 160, 44), (214, 39, 40), (148, 103, 189))
+
+
+def make_plot(seed, size=PLOT_SIZE, alpha=False):
+    # White figure, axes box, grid, a few smooth curves and tick labels: flat colors with anti-aliased edges
+    rng = random.Random(seed)
+    w, h = size
+    img = Image.new("RGBA" if alpha else "RGB", size, (255, 255, 255, 255) if alpha else (255, 255, 255))
+    draw = ImageDraw.Draw(img)
+    left, top, right, bottom = int(w * 0.12), int(h * 0.1), int(w * 0.95), int(h * 0.88)
+    for i in range(1, 8):
+        x = left + (right - left) * i // 8
+        y = top + (bottom - top) * i // 8
+        draw.line([(x, top), (x, bottom)], fill=(230, 230, 230), width=1)
+        draw.line([(left, y), (right, y)], fill=(230, 230, 230), width=1)
+        draw.text((x - 6, bottom + 8), str(i), fill=(0, 0, 0))
+        draw.text((left - 24, y - 6), str(8 - i), fill=(0, 0, 0))
+    draw.rectangle([left, top, right, bottom], outline=(0, 0, 0), width=2)
+    for color in LINE_COLORS[:rng.randint(1, len(LINE_COLORS))]:
+        phase, freq, amp = rng.uniform(0, 6), rng.uniform(1, 4), rng.uniform(0.1, 0.4)
+        points = []
+        for px in range(left, right, 4):
+            t = (px - left) / (right - left)
+            py = (top + bottom) / 2 - amp * (bottom - top) * math.sin(phase + freq * t * 2 * math.pi)
+            points.append((px, py))
+        draw.line(points, fill=color, width=3)
+    draw.text((w // 2 - 60, top // 2), f"run {seed}", fill=(0, 0, 0))
+    return img
+
+
+def plot_png(seed, size=PLOT_SIZE):
+    buf = io.BytesIO()
+    make_plot(seed, size).save(buf, "PNG")
+    return buf.getvalue()
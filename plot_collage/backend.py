@@ -0,0 +1,247 @@
+from abc import ABC, abstractmethod
+import heapq
+import itertools
+import time
+import tkinter as tk
+from PIL import ImageTk
+
+
+class CanvasBackend(ABC):
+    """
+    The drawing surface CollageCanvas and ImageItem talk to: the subset of the
+    tk.Canvas API they use, plus `make_photo` to turn a PIL image into
+    something `create_image`/`itemconfig(image=...)` accept. A backend
+    missing any of them cannot be instantiated.
+    """
+
+    @abstractmethod
+    def create_image(self, x, y, **options):
+        ...
+
+    @abstractmethod
+    def create_oval(self, x0, y0, x1, y1, **options):
+        ...
+
+    @abstractmethod
+    def create_text(self, x, y, **options):
+        ...
+
+    @abstractmethod
+    def create_line(self, *coords, **options):
+        ...
+
+    @abstractmethod
+    def coords(self, item_id, *coords):
+        ...
+
+    @abstractmethod
+    def itemconfig(self, item_id, **options):
+        ...
+
+    @abstractmethod
+    def delete(self, item_id):
+        ...
+
+    @abstractmethod
+    def tag_raise(self, item_id):
+        ...
+
+    @abstractmethod
+    def tag_lower(self, item_id):
+        ...
+
+    @abstractmethod
+    def configure(self, **options):
+        ...
+
+    config = configure
+
+    @abstractmethod
+    def canvasx(self, x):
+        ...
+
+    @abstractmethod
+    def canvasy(self, y):
+        ...
+
+    @abstractmethod
+    def winfo_width(self):
+        ...
+
+    @abstractmethod
+    def winfo_height(self):
+        ...
+
+    @abstractmethod
+    def scan_mark(self, x, y):
+        ...
+
+    @abstractmethod
+    def scan_dragto(self, x, y, gain=10):
+        ...
+
+    @abstractmethod
+    def after(self, ms, func):
+        ...
+
+    @abstractmethod
+    def after_cancel(self, job):
+        ...
+
+    @abstractmethod
+    def make_photo(self, image):
+        ...
+
+    @abstractmethod
+    def update_photo(self, photo, image, at):
+        """Overwrite the pixels of `photo` at `at` (x, y) with the PIL `image`."""
+
+
+class TkCanvas(tk.Canvas, CanvasBackend):
+    """The on-screen backend: a plain tk.Canvas that creates ImageTk photos."""
+
+    def make_photo(self, image):
+        return ImageTk.PhotoImage(image)
+
+    def update_photo(self, photo, image, at):
+        # Tk's `photo copy -to` blits the patch in place; the photo keeps its name and canvas item
+        patch = ImageTk.PhotoImage(image)
+        self.tk.call(str(photo), "copy", str(patch), "-to", *at)
+
+
+class RecordedPhoto:
+    def __init__(self, image):
+        self.width, self.height = image.size
+
+    def nbytes(self):
+        return self.width * self.height * 4
+
+
+class RecordingCanvas(CanvasBackend):
+    """
+    In-memory backend for benchmarks and tests: items are plain dicts, every
+    call is counted, photo uploads are tallied in bytes, and `after` callbacks
+    wait in a queue until `run_pending`/`run_until_idle` executes them.
+    """
+
+    def __init__(self, width=1200, height=1200):
+        self.width = width
+        self.height = height
+        self.items = {}  # id -> {"type", "coords", "options"}
+        self.calls = {}  # method name -> count
+        self.photo_bytes = 0
+        self.options = {}
+        self.view = (0, 0)  # canvas coordinates of the window's top-left corner
+        self._mark = None
+        self._ids = itertools.count(1)
+        self._jobs = []  # heap of (due, seq, job id, func)
+        self._cancelled = set()
+        self._clock = 0.0  # virtual milliseconds
+
+    def _count(self, name):
+        self.calls[name] = self.calls.get(name, 0) + 1
+
+    def _create(self, kind, coords, options):
+        self._count("create_" + kind)
+        item_id = next(self._ids)
+        self.items[item_id] = {"type": kind, "coords": list(coords), "options": dict(options)}
+        return item_id
+
+    def create_image(self, x, y, **options):
+        return self._create("image", (x, y), options)
+
+    def create_oval(self, x0, y0, x1, y1, **options):
+        return self._create("oval", (x0, y0, x1, y1), options)
+
+    def create_text(self, x, y, **options):
+        return self._create("text", (x, y), options)
+
+    def create_line(self, *coords, **options):
+        return self._create("line", coords, options)
+
+    def coords(self, item_id, *coords):
+        self._count("coords")
+        if coords:
+            self.items[item_id]["coords"] = list(coords)
+        return self.items[item_id]["coords"]
+
+    def itemconfig(self, item_id, **options):
+        self._count("itemconfig")
+        self.items[item_id]["options"].update(options)
+
+    def delete(self, item_id):
+        self._count("delete")
+        self.items.pop(item_id, None)
+
+    def tag_raise(self, item_id):
+        self._count("tag_raise")
+        self.items[item_id] = self.items.pop(item_id)
+
+    def tag_lower(self, item_id):
+        self._count("tag_lower")
+        self.items = {item_id: self.items.pop(item_id), **self.items}
+
+    def configure(self, **options):
+        self._count("configure")
+        self.options.update(options)
+
+    config = configure
+
+    def canvasx(self, x):
+        return self.view[0] + x
+
+    def canvasy(self, y):
+        return self.view[1] + y
+
+    def winfo_width(self):
+        return self.width
+
+    def winfo_height(self):
+        return self.height
+
+    def scan_mark(self, x, y):
+        self._mark = (x, y, self.view)
+
+    def scan_dragto(self, x, y, gain=10):
+        mx, my, (vx, vy) = self._mark
+        self.view = (vx - (x - mx) * gain, vy - (y - my) * gain)
+
+    def after(self, ms, func):
+        job = next(self._ids)
+        heapq.heappush(self._jobs, (self._clock + ms, job, func))
+        return job
+
+    def after_cancel(self, job):
+        self._cancelled.add(job)
+
+    def make_photo(self, image):
+        self._count("make_photo")
+        photo = RecordedPhoto(image)
+        self.photo_bytes += photo.nbytes()
+        return photo
+
+    def update_photo(self, photo, image, at):
+        self._count("update_photo")
+        self.photo_bytes += image.width * image.height * 4
+
+    def run_pending(self, ms=0):
+        """Advance the virtual clock by `ms` and run every callback that became due."""
+        self._clock += ms
+        while self._jobs and self._jobs[0][0] <= self._clock:
+            _, job, func = heapq.heappop(self._jobs)
+            if job in self._cancelled:
+                self._cancelled.discard(job)
+                continue
+            func()
+
+    def run_until_idle(self, timeout=60.0):
+        """Run callbacks in due order, skipping the virtual clock ahead, until none are left."""
+        deadline = time.monotonic() + timeout
+        while self._jobs and time.monotonic() < deadline:
+            self._clock = max(self._clock, self._jobs[0][0])
+            self.run_pending()
+            # Let render/export worker threads make progress before a poll callback re-runs
+            time.sleep(0.0005)
+
+    def visible_items(self, kind=None):
+        return [i for i in self.items.values() if i["options"].get("state") != "hidden" and (kind is None or i["type"] == kind)]
@@ -0,0 +1,108 @@
+import base64
+import io
+import re
+import shutil
+import subprocess
+from urllib.request import urlopen
+from PIL import Image
+from .instrument import TRACER, traced
+from .source import IMAGES
+
+# Preferred clipboard targets, best first; text/html is only used when no image target is offered
+IMAGE_TARGETS = ("image/png", "image/webp", "image/bmp", "image/tiff", "image/jpeg", "image/gif")
+HTML_TARGET = "text/html"
+CLIPBOARD_TIMEOUT = 5  # seconds for one xclip call
+DOWNLOAD_TIMEOUT = 10  # seconds for remote <img> sources
+DOWNLOAD_MAX_BYTES = 64 * 1024 * 1024
+
+
+class XclipClipboard:
+    """
+    Clipboard provider backed by xclip.
+    Availability is probed once; a provider only needs `available`,
+    `targets()` and `read(target)`, so tests can swap in a fake one.
+    """
+
+    def __init__(self):
+        self.available = shutil.which("xclip") is not None
+
+    def _run(self, target):
+        return subprocess.run(
+            ['xclip', '-selection', 'clipboard', '-t', target, '-o'],
+            check=True, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, timeout=CLIPBOARD_TIMEOUT,
+        ).stdout
+
+    def targets(self):
+        try:
+            return self._run("TARGETS").decode(errors='ignore').split()
+        except Exception:
+            return []
+
+    def read(self, target):
+        return self._run(target)
+
+
+def choose_target(targets):
+    for target in IMAGE_TARGETS:
+        if target in targets:
+            return target
+    if HTML_TARGET in targets:
+        return HTML_TARGET
+    return None
+
+
+def download(url, timeout=DOWNLOAD_TIMEOUT, max_bytes=DOWNLOAD_MAX_BYTES, opener=urlopen):
+    with opener(url, timeout=timeout) as response:
+        length = response.headers.get("Content-Length")
+        if length is not None and int(length) > max_bytes:
+            raise ValueError(f"image is {int(length)} bytes, limit is {max_bytes}")
+        data = response.read(max_bytes + 1)
+    if len(data) > max_bytes:
+        raise ValueError(f"image exceeds {max_bytes} bytes")
+    return data
+
+
+def image_bytes_from_html(html, opener=urlopen):
+    # Inline base64 first, then a remote URL
+    m = re.search(r'<img[^>]+src="data:image/[^;]+;base64,([^"]+)"', html)
+    if m:
+        return base64.b64decode(m.group(1))
+    m_url = re.search(r'<img[^>]+src="(https?://[^"]+)"', html)
+    if m_url:
+        return download(m_url.group(1), opener=opener)
+    return None
+
+
+def decode(data):
+    img = Image.open(io.BytesIO(data))
+    img.load()
+    return img
+
+
+def intern_encoded(data):
+    """Shared ImageSource for encoded image bytes (clipboard, watched or sent files)."""
+    source = IMAGES.intern(decode(data))
+    if source.encoded is None:
+        # Sessions and the autosave journal store these bytes as they are instead of re-encoding
+        source.encoded = lambda: data
+    return source
+
+
+@traced("fetch clipboard")
+def fetch_clipboard_image(provider, opener=urlopen):
+    """
+    Read the clipboard with a single TARGETS query and return an ImageSource, or None.
+    Runs on a worker thread: clipboard reads, downloads, decoding, hashing and
+    proxy building all stay off the Tk loop. Content already on the board comes
+    back as the existing shared source.
+    """
+    target = choose_target(provider.targets())
+    if target is None:
+        return None
+    data = provider.read(target)
+    if target == HTML_TARGET:
+        data = image_bytes_from_html(data.decode(errors='ignore'), opener)
+        if data is None:
+            return None
+    TRACER.add_bytes("fetch clipboard", len(data))
+    return intern_encoded(data)
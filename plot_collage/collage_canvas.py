@@ -1,67 +1,190 @@
-import tkinter as tk
-from PIL import ImageGrab, Image
-import subprocess
-import re
-import base64
-import io
+import queue
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import numpy as np
+from PIL import Image
 from .image_item import ImageItem
-from urllib.request import urlopen
+from .render_cache import BASE_SCALE, ZOOM_STEP, zoom_level
+from .spatial_index import GeometryStore, rects_overlap
+from .render_pool import RenderPool
+from .layout import place_near, skyline_pack
+from .export import ExportCancelled, ExportJob, collect_layers, copy_to_clipboard, snapshot
+from .clipboard import XclipClipboard, fetch_clipboard_image, intern_encoded
+from .source import IMAGES
+from .instrument import TRACER, Overlay, trace_path, traced
+from .compositor import COMPOSITE_MIN_ITEMS, Compositor
+from .session import SESSION_SUFFIX, read_session, save_session
+from .watch import FolderWatcher
 
 
 WINDOW_START_X = 3840
 # WINDOW_START_X = 4200
+RENDER_MARGIN = 400  # screen pixels around the window that are rendered ahead of panning
+SCROLL_MARGIN = 500
+DRAG_FRAME_MS = 16  # at most one drag update per display frame
+REFINE_DELAY_MS = 200  # wheel idle time before previews are re-rendered with LANCZOS
+EXPORT_POLL_MS = 50
+EXPORT_SCALE = "full"  # "full" resolution or "view" (the current zoom level)
+EXPORT_ENCODING = "default"  # one of export.ENCODINGS
+PASTE_WORKERS = 2
+PASTE_POLL_MS = 30
+PLACEHOLDER_SIZE = (800, 600)  # logical size of the stand-in shown while a paste is loading
+PLACEHOLDER_COLOR = (225, 225, 225)
+WATCH_POLL_MS = 100
+SERVER_POLL_MS = 50
+WATCH_BATCH = 50  # watched files put on the board per Tk callback; the rest wait for the next one
 
 class CollageCanvas:
-    def __init__(self, root):
+    def __init__(self, root, clipboard=None, backend=None, journal=None):
+        # root=None with no backend is a headless board (layout/export only);
+        # root=None with a backend such as RecordingCanvas renders without a window.
+        # A journal.Journal autosaves every change and provides undo/redo.
         self.root = root
-        self.root.geometry(f"{720}x{1440}+{WINDOW_START_X}+{0}")
-        self.canvas = tk.Canvas(root, width=1200, height=1200, bg="white")
-        self.canvas.pack(fill=tk.BOTH, expand=True)
+        self.images = []
+        self.geometry = GeometryStore()  # positions, sizes and z-order of all items
+        self.current_scale = BASE_SCALE
+        self.selected_image = None
+        self.drag_offset = (0, 0)
+        self.drag_target = None
+        self.drag_job = None
+        self.refine_delay_ms = REFINE_DELAY_MS
+        self.composite_threshold = COMPOSITE_MIN_ITEMS  # item count from which the board is one composited bitmap
+        self.compositor = None
+        self.refine_job = None
+        self.export_scale = EXPORT_SCALE
+        self.export_encoding = EXPORT_ENCODING
+        self.export_job = None
+        self.export_key = None
+        self.export_cache = None  # (layout key, placements, (data, mime)) of the last export
+        self.deliver_export = copy_to_clipboard  # receives (data, mime) on the export thread
+        self.clipboard = clipboard
+        self.pending_pastes = []  # (placeholder item, future)
+        self.overlay = None
+        self.placeholder = None  # shared stand-in source for pastes still loading
+        self.session_path = None
+        self.watcher = None
+        self.watched = {}  # path -> item showing the file
+        self.server = None  # server.InstanceServer taking requests from later invocations
+        self.journal = journal
+        if journal is not None:
+            journal.attach(self)
+        if root is None and backend is None:
+            # Headless board: layout and collision logic only, nothing is drawn
+            self.canvas = None
+            self.pool = None
+            return
+        if backend is None:
+            # Only on-screen boards need Tk; headless compose runs on Pythons built without it
+            from .backend import TkCanvas
+            self.root.geometry(f"{720}x{1440}+{WINDOW_START_X}+{0}")
+            backend = TkCanvas(root, width=1200, height=1200, bg="white")
+            backend.pack(fill="both", expand=True)
+        self.canvas = backend
+        self.pool = RenderPool(self.canvas)
+        self.clipboard = clipboard or XclipClipboard()
+        self.paste_executor = ThreadPoolExecutor(max_workers=PASTE_WORKERS, thread_name_prefix="paste")
         self.canvas.config(scrollregion=(-500, -500, 10000, 10000))
         # Draw boundary lines for x=0 and y=0 and store their IDs
         self.x_axis_id = self.canvas.create_line(0, 0, 0, 1200, fill='black', width=2)  # y-axis
         self.y_axis_id = self.canvas.create_line(0, 0, 1200, 0, fill='black', width=2)  # x-axis
-        self.images = []
-        self.current_scale = 0.25
-        self.selected_image = None
-        self.drag_offset = (0, 0)
+        self.overlay = Overlay(self.canvas)
+        if root is None:
+            return
+        if TRACER.enabled:
+            self.overlay.start()
+        self.title = self.root.title()
         self.setup_bindings()
         self.root.bind_all('<space>', self.copy_collage_to_clipboard)
+        self.root.bind_all('<Control-space>', lambda e: self.copy_collage_to_clipboard(e, scale="view"))
+
+    def on_escape(self, event=None):
+        # Escape cancels a running export before it closes the board
+        if self.export_job is not None:
+            self.export_job.cancel()
+        else:
+            self.close()
+
+    def toggle_tracing(self, event=None):
+        # F12 starts a fresh trace with the overlay; pressing it again writes the trace out
+        if TRACER.enabled:
+            self.stop_tracing()
+        else:
+            TRACER.reset()
+            TRACER.enabled = True
+            self.overlay.start()
+
+    def stop_tracing(self):
+        TRACER.enabled = False
+        self.overlay.stop()
+        path = trace_path()
+        TRACER.dump(path)
+        print(TRACER.summary())
+        print(f"Trace written to {path}")
+
+    def close(self):
+        if TRACER.enabled and self.overlay.job is not None:
+            # A trace this window is showing is written out on exit
+            self.stop_tracing()
+        if self.journal is not None:
+            self.journal.view(self.current_scale, (self.canvas.canvasx(0), self.canvas.canvasy(0)))
+            self.journal.close()
+        self.pool.shutdown()
+        self.paste_executor.shutdown(wait=False, cancel_futures=True)
+        if self.watcher is not None:
+            self.watcher.stop()
+        if self.server is not None:
+            self.server.stop()
+        if self.root is not None:
+            self.root.destroy()
+
+    def placed_images(self):
+        # Items showing real pixels; placeholders of pastes still loading are not exported or saved
+        pending = {item for item, _ in self.pending_pastes}
+        return [img for img in self.images if img not in pending]
 
     def get_total_bbox(self):
-        if not self.images:
-            return None
-        bboxes = [img.get_bbox() for img in self.images]
-        min_x = min(b[0] for b in bboxes)
-        min_y = min(b[1] for b in bboxes)
-        max_x = max(b[2] for b in bboxes)
-        max_y = max(b[3] for b in bboxes)
-        return (min_x, min_y, max_x, max_y)
-
-    def copy_collage_to_clipboard(self, event=None):
-        bbox = self.get_total_bbox()
-        if not bbox:
+        return self.geometry.total_bbox()
+
+    @traced("copy_collage_to_clipboard")
+    def copy_collage_to_clipboard(self, event=None, scale=None):
+        if self.export_job is not None:
+            print("Export already running")
             return
-        min_x, min_y, max_x, max_y = bbox
-        width, height = int(max_x - min_x), int(max_y - min_y)
-        collage = Image.new("RGBA", (width, height), (255, 255, 255, 0))
-        for img in self.images:
-            x, y = img.pos
-            offset_x = int(x - img.pil.width // 2 - min_x)
-            offset_y = int(y - img.pil.height // 2 - min_y)
-            collage.paste(img.pil, (offset_x, offset_y), img.pil if img.pil.mode == 'RGBA' else None)
-        # Now put collage to clipboard as PNG
-        try:
-            import io
-            import subprocess
-            output = io.BytesIO()
-            collage.save(output, "PNG")
-            data = output.getvalue()
-            p = subprocess.Popen(['xclip', '-selection', 'clipboard', '-t', 'image/png', '-i'], stdin=subprocess.PIPE)
-            p.communicate(data)
-            print("Clipboard copy successful (PNG)")
-        except Exception as e:
-            print("Clipboard copy failed:", e)
+        images = self.placed_images()
+        if not images:
+            return
+        scale = scale or self.export_scale
+        level = zoom_level(self.current_scale) if scale == "view" else None
+        placements = snapshot(images)
+        # An unchanged layout reuses the last encoded result. The key holds the sources
+        # themselves, not their ids: a replaced source that was freed could pass its id on
+        key = (tuple((img.source, pos) for img, pos in placements), level, self.export_encoding)
+        cached = self.export_cache[2] if self.export_cache and self.export_cache[0] == key else None
+        executor = self.pool.executor
+        self.export_job = ExportJob(lambda: collect_layers(placements, level, executor), self.export_encoding, self.deliver_export, cached).start()
+        self.export_key = (key, placements)
+        self.canvas.after(EXPORT_POLL_MS, self.poll_export)
+
+    def poll_export(self):
+        job = self.export_job
+        if not job.done:
+            self.set_status(f"exporting {job.progress:.0%}")
+            self.canvas.after(EXPORT_POLL_MS, self.poll_export)
+            return
+        self.export_job = None
+        self.set_status(None)
+        if isinstance(job.error, ExportCancelled):
+            print("Export cancelled")
+        elif job.error is not None:
+            print("Clipboard copy failed:", job.error)
+        else:
+            self.export_cache = (*self.export_key, job.result)
+            print(f"Clipboard copy successful ({job.result[1]}, {len(job.result[0]) / 2**20:.1f} MiB)")
+
+    def set_status(self, text):
+        # Progress goes to the window title; boards without a window have none
+        if self.root is not None:
+            self.root.title(f"{self.title} - {text}" if text else self.title)
 
     def boundary_check(self, bbox):
         # Returns True if bbox is within allowed boundaries (x >= 0, y >= 0)
@@ -73,20 +196,180 @@ class CollageCanvas:
         self.canvas.bind("<ButtonPress-1>", self.start_drag)
         self.canvas.bind("<B1-Motion>", self.drag)
         self.root.bind_all('<Control-v>', self.paste_clipboard_image)
-        self.root.bind('<Escape>', lambda e: self.root.destroy())
+        self.root.bind_all('<Control-a>', self.auto_arrange)
+        self.root.bind('<Escape>', self.on_escape)
+        self.root.bind_all('<F12>', self.toggle_tracing)
+        self.root.bind_all('<Control-s>', self.save_session)
+        self.root.bind_all('<Control-o>', self.open_session)
+        self.root.bind_all('<Control-z>', self.undo)
+        self.root.bind_all('<Control-y>', self.redo)
+        self.root.bind_all('<Control-Z>', self.redo)
+        self.root.bind_all('<Delete>', self.delete_image_at)
         self.canvas.bind("<ButtonPress-3>", self.on_image_press)
         self.canvas.bind("<B3-Motion>", self.on_image_drag)
         self.canvas.bind("<ButtonRelease-3>", self.on_image_release)
 
-    def rerender_images(self, allow_collisions=True):
+    def ask_session_path(self, save):
+        from tkinter import filedialog
+        options = dict(defaultextension=SESSION_SUFFIX, filetypes=[("Plot collage session", "*" + SESSION_SUFFIX)])
+        if save:
+            return filedialog.asksaveasfilename(initialfile=self.session_path or "collage" + SESSION_SUFFIX, **options)
+        return filedialog.askopenfilename(**options)
+
+    def save_session(self, event=None, path=None):
+        path = path or self.session_path or (self.ask_session_path(save=True) if self.root is not None else None)
+        if not path:
+            return
+        save_session(self, path)
+        self.session_path = path
+        print(f"Session saved to {path}")
+
+    def open_session(self, event=None, path=None):
+        # Replaces the board; items show up at once and decode as they come into view
+        path = path or (self.ask_session_path(save=False) if self.root is not None else None)
+        if not path:
+            return
+        meta, sources = read_session(path)
         for img in self.images:
-            img.render(self.current_scale)
+            img.delete()
+        self.images = []
+        self.export_cache = None
+        for item in meta["items"]:
+            self.images.append(ImageItem(sources[item["blob"]], tuple(item["pos"]), item["idx"], self.canvas, self.geometry, self.pool))
+        self.session_path = path
+        self.set_view(meta["scale"], meta["view"])
+        if self.journal is not None:
+            # The opened board replaces the autosaved one; it cannot be undone
+            self.journal.checkpoint(clear_history=True)
+
+    def set_view(self, scale, origin):
+        # Zoom to `scale` and scroll so `origin` (scaled canvas coordinates) is the window's top-left corner
+        if self.canvas is None:
+            return
+        self.current_scale = scale
+        self.pool.next_generation()
+        if self.compositor is not None:
+            self.compositor.close()
+            self.compositor = None
+        x, y = origin
+        self.canvas.scan_mark(0, 0)
+        self.canvas.scan_dragto(int(self.canvas.canvasx(0) - x), int(self.canvas.canvasy(0) - y), gain=1)
+        self.rerender_images()
+
+    def restore(self):
+        """Bring back the autosaved board of the last run, if there is one."""
+        if self.journal is not None and self.journal.restore():
+            print(f"Restored {len(self.images)} images from {self.journal.dir}")
+
+    def apply_changes(self, changes):
+        # Journaled changes (see journal.Journal) applied without journaling them again
+        journal = self.journal
+        swap = None
+        for change in changes:
+            op = change["op"]
+            if swap is not None and op == "add" and change["index"] == swap[1]:
+                # remove + add at the same index is a swap of pixels (a rewritten watched file)
+                journal.bind(swap[0], change["uid"])
+                swap[0].set_source(journal.source(change))
+                swap[0].pos = tuple(change["pos"])
+                swap = None
+                continue
+            if swap is not None:
+                self.remove_image(swap[0])
+                swap = None
+            if op == "move":
+                journal.items[change["uid"]].pos = tuple(change["to"])
+            elif op == "add":
+                index = min(change["index"], len(self.images))
+                item = ImageItem(journal.source(change), tuple(change["pos"]), index, self.canvas, self.geometry, self.pool)
+                for other in self.images[index:]:
+                    other.set_idx(other.idx + 1)
+                self.images.insert(index, item)
+                journal.bind(item, change["uid"])
+            else:
+                item = journal.items[change["uid"]]
+                journal.unbind(item)
+                swap = (item, change["index"])
+        if swap is not None:
+            self.remove_image(swap[0])
+
+    def undo(self, event=None):
+        if self.journal is not None and self.journal.undo():
+            self.redraw()
+
+    def redo(self, event=None):
+        if self.journal is not None and self.journal.redo():
+            self.redraw()
+
+    def redraw(self):
+        if self.compositor is not None:
+            self.compositor.image = None
+        self.rerender_images()
+
+    def delete_image_at(self, event):
+        img = self.find_image_at(self.canvas.canvasx(event.x), self.canvas.canvasy(event.y))
+        if img is None or any(item is img for item, _ in self.pending_pastes):
+            return
+        change = self.journal.removed(img) if self.journal is not None else None
+        self.remove_image(img)
+        if change is not None:
+            self.journal.commit([change])
+        self.update_scrollregion()
+
+    def get_viewport(self, margin=0):
+        # Visible area in canvas (scaled) coordinates
+        x0 = self.canvas.canvasx(0) - margin
+        y0 = self.canvas.canvasy(0) - margin
+        x1 = self.canvas.canvasx(self.canvas.winfo_width()) + margin
+        y1 = self.canvas.canvasy(self.canvas.winfo_height()) + margin
+        return (x0, y0, x1, y1)
+
+    def get_scaled_bbox(self, img):
+        return tuple(v * self.current_scale for v in img.get_bbox())
+
+    @property
+    def composited(self):
+        return self.compositor is not None
+
+    def render_visible(self, fast=False):
+        if len(self.images) >= self.composite_threshold:
+            if self.compositor is None:
+                # Switch to one bitmap for the whole window; per-item canvas images are dropped
+                for img in self.images:
+                    img.cull()
+                self.compositor = Compositor(self)
+            self.compositor.render(fast)
+            return
+        if self.compositor is not None:
+            self.compositor.close()
+            self.compositor = None
+        # Only items near the viewport get pixels; the rest are culled until panned into view
+        visible = set(self.geometry.query(tuple(v / self.current_scale for v in self.get_viewport(RENDER_MARGIN))))
+        # Very large bitmaps only render the tiles under the window itself
+        viewport = self.get_viewport()
+        for img in self.images:
+            if img in visible:
+                img.render(self.current_scale, fast, viewport)
+            else:
+                img.cull()
+
+    def update_scrollregion(self):
+        # Culled items are hidden, so bbox("all") no longer covers the board
+        bbox = self.get_total_bbox()
+        if not bbox:
+            return
+        x0, y0, x1, y1 = (v * self.current_scale for v in bbox)
+        self.canvas.configure(scrollregion=(
+            min(x0, 0) - SCROLL_MARGIN, min(y0, 0) - SCROLL_MARGIN,
+            x1 + SCROLL_MARGIN, y1 + SCROLL_MARGIN,
+        ))
+
+    @traced("rerender_images")
+    def rerender_images(self, allow_collisions=True, fast=False):
         if not allow_collisions:
             self.resolve_collisions()
-        for img in self.images:
-            if img.id is not None:
-                x, y = int(img.pos[0] * self.current_scale), int(img.pos[1] * self.current_scale)
-                self.canvas.coords(img.id, x, y)
+        self.render_visible(fast)
+        self.update_scrollregion()
 
         # Only draw axes for x>0 and y>0 (positive quadrant)
         x0 = self.canvas.canvasx(0) / self.current_scale
@@ -108,85 +391,229 @@ class CollageCanvas:
         )
 
     def zoomerP(self, event):
-        self.current_scale *= 1.1
-        self.rerender_images()
+        self.zoom(ZOOM_STEP)
 
     def zoomerM(self, event):
-        self.current_scale /= 1.1
-        self.rerender_images()
+        self.zoom(1 / ZOOM_STEP)
+
+    @traced("zoom")
+    def zoom(self, factor):
+        # Preview immediately, refine once the wheel has been idle for refine_delay_ms
+        self.current_scale *= factor
+        self.pool.next_generation()
+        self.rerender_images(fast=True)
+        if self.refine_job is not None:
+            self.canvas.after_cancel(self.refine_job)
+        self.refine_job = self.canvas.after(self.refine_delay_ms, self.refine_zoom)
+
+    @traced("refine_zoom")
+    def refine_zoom(self):
+        self.refine_job = None
+        self.render_visible()
+        if self.journal is not None:
+            self.journal.view(self.current_scale, (self.canvas.canvasx(0), self.canvas.canvasy(0)))
 
     def start_drag(self, event):
         self.canvas.scan_mark(event.x, event.y)
 
+    @traced("pan")
     def drag(self, event):
         self.canvas.scan_dragto(event.x, event.y, gain=1)
+        # Keep panning cheap while a zoom refine is still pending
+        self.render_visible(fast=self.refine_job is not None)
 
-    def check_xclip(self):
-        try:
-            subprocess.run(["xclip", "-version"], check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-            return True
-        except Exception:
-            return False
-
+    @traced("paste_clipboard_image")
     def paste_clipboard_image(self, event=None):
-        if not self.check_xclip():
+        if not self.clipboard.available:
             print("xclip is required for clipboard image paste on Linux. Please install it with: sudo apt install xclip")
             return
-        # 1. Try ImageGrab.grabclipboard()
-        img = ImageGrab.grabclipboard()
-        if not isinstance(img, Image.Image):
-            # 2. Try to extract base64 image from HTML clipboard
-            try:
-                html = subprocess.check_output(
-                    ['xclip', '-selection', 'clipboard', '-t', 'text/html', '-o'],
-                    stderr=subprocess.DEVNULL
-                ).decode(errors='ignore')
-            except Exception:
-                html = ''
-            # Try base64 first
-            m = re.search(r'<img[^>]+src="data:image/[^;]+;base64,([^"]+)"', html)
-            if m:
-                b64_data = m.group(1)
-                try:
-                    img_bytes = io.BytesIO(base64.b64decode(b64_data))
-                    img = Image.open(img_bytes)
-                except Exception:
-                    img = None
-            else:
-                # Try remote URL
-                m_url = re.search(r'<img[^>]+src="(https?://[^"]+)"', html)
-                if m_url:
-                    url = m_url.group(1)
-                    try:
-                        with urlopen(url) as response:
-                            img_bytes = io.BytesIO(response.read())
-                            img = Image.open(img_bytes)
-                    except Exception as e:
-                        print("Failed to download image from URL:", e)
-                        img = None
-        if img is not None:
-            # Get mouse position if available, else center
-            if event is not None:
-                x0 = self.canvas.canvasx(event.x) / self.current_scale
-                y0 = self.canvas.canvasy(event.y) / self.current_scale
-            else:
-                x0 = self.canvas.canvasx(self.canvas.winfo_width() // 2) / self.current_scale
-                y0 = self.canvas.canvasy(self.canvas.winfo_height() // 2) / self.current_scale
-            item = ImageItem(img, (x0, y0), len(self.images), self.canvas)
-            self.images.append(item)
+        self.add_pending(self.paste_executor.submit(fetch_clipboard_image, self.clipboard), event)
+
+    def add_file(self, path):
+        self.add_pending(self.paste_executor.submit(lambda: intern_encoded(Path(path).read_bytes())))
+
+    def add_bytes(self, data):
+        self.add_pending(self.paste_executor.submit(intern_encoded, data))
+
+    def add_pending(self, future, event=None):
+        """Hold a spot at the pointer (or the view centre) until `future` delivers the ImageSource."""
+        # Get mouse position if available, else center
+        if event is not None:
+            x0 = self.canvas.canvasx(event.x) / self.current_scale
+            y0 = self.canvas.canvasy(event.y) / self.current_scale
+        else:
+            x0 = self.canvas.canvasx(self.canvas.winfo_width() // 2) / self.current_scale
+            y0 = self.canvas.canvasy(self.canvas.winfo_height() // 2) / self.current_scale
+        # A placeholder holds the spot while the image is read and decoded in the background
+        if self.placeholder is None:
+            self.placeholder = IMAGES.intern(Image.new("RGB", PLACEHOLDER_SIZE, PLACEHOLDER_COLOR), spill=False)
+        tracked = self.compositor.track() if self.composited else None
+        item = ImageItem(self.placeholder, (x0, y0), len(self.images), self.canvas, self.geometry, self.pool)
+        self.images.append(item)
+        self.resolve_collisions(item)
+        if tracked is not None:
+            self.compositor.repaint_moved(tracked)
+        self.rerender_images()
+        if not self.pending_pastes:
+            self.canvas.after(PASTE_POLL_MS, self.poll_pastes)
+        self.pending_pastes.append((item, future))
+
+    @traced("poll_pastes")
+    def poll_pastes(self):
+        still_pending = []
+        for item, future in self.pending_pastes:
+            if not future.done():
+                still_pending.append((item, future))
+                continue
+            if item not in self.images:
+                continue
+            error = future.exception()
+            source = future.result() if error is None else None
+            if source is None:
+                if error is not None:
+                    print("Paste failed:", error)
+                else:
+                    print("No image in clipboard.")
+                self.remove_image(item)
+                continue
+            tracked = self.compositor.track() if self.composited else None
+            placeholder = self.compositor.item_rect(item) if tracked is not None else None
+            item.set_source(source)
+            if any(other.source is source for other in self.images if other is not item):
+                items, distinct, saved = IMAGES.stats()
+                print(f"Pasted image is already on the board; {items} images share {distinct} buffers, saving {saved / 2**20:.1f} MiB")
             self.resolve_collisions(item)
+            if tracked is not None:
+                self.compositor.invalidate(placeholder)
+                self.compositor.invalidate(self.compositor.item_rect(item))
+                self.compositor.repaint_moved(tracked)
+            if self.journal is not None:
+                self.journal.commit([self.journal.added(item)])
             self.rerender_images()
-            self.canvas.configure(scrollregion=self.canvas.bbox("all"))
-        else:
-            print("No image in clipboard.")
+        self.pending_pastes = still_pending
+        if still_pending:
+            self.canvas.after(PASTE_POLL_MS, self.poll_pastes)
+
+    def watch(self, *directories):
+        """Put the image files of `directories` on the board and keep them current as they are rewritten."""
+        if self.watcher is not None:
+            self.watcher.directories.extend(directories)
+            return
+        self.watcher = FolderWatcher(directories).start()
+        self.canvas.after(WATCH_POLL_MS, self.poll_watch)
+
+    @traced("poll_watch")
+    def poll_watch(self):
+        added, swapped, changes = [], [], []
+        relayout = False
+        unclaimed = None  # source -> items not tied to a file yet, e.g. restored from the journal
+        for _ in range(WATCH_BATCH):
+            try:
+                path, result = self.watcher.results.get_nowait()
+            except queue.Empty:
+                break
+            if isinstance(result, Exception):
+                print(f"Could not load {path}:", result)
+                continue
+            item = self.watched.get(path)
+            if item is not None and item in self.images:
+                if result is not item.source:
+                    relayout |= result.size != item.source.size
+                    changes += self.swap_source(item, result)
+                    swapped.append(item)
+                continue
+            if unclaimed is None:
+                claimed = set(self.watched.values())
+                unclaimed = {}
+                for img in self.images:
+                    if img not in claimed:
+                        unclaimed.setdefault(img.source, []).append(img)
+            if unclaimed.get(result):
+                self.watched[path] = unclaimed[result].pop()
+                continue
+            x0 = self.canvas.canvasx(self.canvas.winfo_width() // 2) / self.current_scale
+            y0 = self.canvas.canvasy(self.canvas.winfo_height() // 2) / self.current_scale
+            item = ImageItem(result, (x0, y0), len(self.images), self.canvas, self.geometry, self.pool)
+            self.images.append(item)
+            self.watched[path] = item
+            added.append(item)
+        if added or relayout:
+            self.resolve_collisions()
+            if self.composited:
+                self.compositor.image = None
+        if self.journal is not None and (added or changes):
+            self.journal.commit(changes + [self.journal.added(item) for item in added])
+        if added or swapped:
+            self.render_visible()
+            self.update_scrollregion()
+        # A backlog is worked off in batches, with Tk events handled in between
+        self.canvas.after(1 if not self.watcher.results.empty() else WATCH_POLL_MS, self.poll_watch)
+
+    def serve(self, server):
+        """Handle the requests later `plot-collage` invocations send to `server`."""
+        self.server = server
+        self.canvas.after(SERVER_POLL_MS, self.poll_requests)
+
+    def poll_requests(self):
+        try:
+            while True:
+                try:
+                    request = self.server.requests.get_nowait()
+                except queue.Empty:
+                    break
+                # The client was told "ok" already; a bad request must not stop the ones after it
+                try:
+                    self.handle_request(*request)
+                except Exception as e:
+                    print(f"plot-collage {request[0]} failed:", e)
+        finally:
+            self.canvas.after(SERVER_POLL_MS, self.poll_requests)
+
+    def handle_request(self, command, paths, data):
+        if command == "show" and self.root is not None:
+            self.root.deiconify()
+            self.root.lift()
+            self.root.focus_force()
+        elif command == "add":
+            for path in paths:
+                self.add_file(path)
+            if data:
+                self.add_bytes(data)
+        elif command == "open":
+            self.open_session(path=paths[0])
+        elif command == "watch":
+            self.watch(*paths)
+
+    def swap_source(self, item, source):
+        # A rewritten file: new pixels for the same item; only its own render is redone
+        changes = []
+        if self.journal is not None and item in self.journal.uids:
+            changes.append(self.journal.removed(item))
+        old = self.compositor.item_rect(item) if self.composited else None
+        item.set_source(source)
+        if old is not None:
+            self.compositor.invalidate(old)
+            self.compositor.invalidate(self.compositor.item_rect(item))
+        if self.journal is not None and changes:
+            changes.append(self.journal.added(item))
+        return changes
+
+    def remove_image(self, img):
+        i = self.images.index(img)
+        self.images.pop(i)
+        img.delete()
+        # Keep the badge numbers contiguous
+        for other in self.images:
+            if other.idx > img.idx:
+                other.set_idx(other.idx - 1)
+        if self.composited:
+            # Renumbered badges can be anywhere in view
+            self.compositor.image = None
+            self.render_visible()
 
     def find_image_at(self, x, y):
-        items = self.canvas.find_overlapping(x, y, x, y)
-        for item_id in reversed(items):
-            for img in self.images:
-                if img.id == item_id:
-                    return img
-        return None
+        # x, y are canvas coordinates; the topmost item is the one created last on the canvas
+        return self.geometry.topmost_at(x / self.current_scale, y / self.current_scale)
 
     def on_image_press(self, event):
         x, y = self.canvas.canvasx(event.x) / self.current_scale, self.canvas.canvasy(event.y) / self.current_scale
@@ -200,92 +627,81 @@ class CollageCanvas:
         if self.selected_image:
             x = self.canvas.canvasx(event.x) / self.current_scale
             y = self.canvas.canvasy(event.y) / self.current_scale
-            new_x = x - self.drag_offset[0]
-            new_y = y - self.drag_offset[1]
-            new_bbox = self.selected_image.get_bbox_at((new_x, new_y))
-            self.selected_image.pos = (new_x, new_y)
-            self.rerender_images(allow_collisions=True)
+            # Coalesce motion events: only the latest target is applied once per frame
+            self.drag_target = (x - self.drag_offset[0], y - self.drag_offset[1])
+            if self.drag_job is None:
+                self.drag_job = self.canvas.after(DRAG_FRAME_MS, self.flush_drag)
 
+    @traced("flush_drag")
+    def flush_drag(self):
+        self.drag_job = None
+        if self.selected_image is None or self.drag_target is None:
+            return
+        img = self.selected_image
+        if self.composited:
+            old = self.compositor.item_rect(img)
+            img.pos = self.drag_target
+            self.drag_target = None
+            self.compositor.invalidate(old)
+            self.compositor.invalidate(self.compositor.item_rect(img))
+            return
+        img.pos = self.drag_target
+        self.drag_target = None
+        img.place(self.current_scale)
+
+    @traced("on_image_release")
     def on_image_release(self, event):
+        if self.drag_job is not None:
+            self.canvas.after_cancel(self.drag_job)
+            self.flush_drag()
         self.selected_image = None
+        tracked = self.compositor.track() if self.composited else None
         self.resolve_collisions()
-        for img in self.images:
-            if img.id is not None:
-                x, y = int(img.pos[0] * self.current_scale), int(img.pos[1] * self.current_scale)
-                self.canvas.coords(img.id, x, y)
+        if tracked is not None:
+            # Items pushed aside by the drop are repainted in the composited bitmap too
+            self.compositor.repaint_moved(tracked)
+        if self.journal is not None:
+            self.journal.commit()
+        self.render_visible()
+        self.update_scrollregion()
 
     def rects_overlap(self, rect1, rect2):
-        return not (rect1[2] <= rect2[0] or rect1[0] >= rect2[2] or rect1[3] <= rect2[1] or rect1[1] >= rect2[3])
-
-    def find_non_overlapping_position(self, item, intended_pos, other):
-        x0, y0 = intended_pos
-        directions = ['right', 'left', 'down', 'up']
-        best_pos = intended_pos
-        min_dist = float('inf')
-        bbox0 = item.get_bbox_at((x0, y0))
-        for direction in directions:
-            min_step = None
-            candidate_pos = None
-            bbox1 = other.get_bbox()
-            if not self.rects_overlap(bbox0, bbox1):
-                continue
-            # Calculate step needed to clear the overlap in this direction
-            if direction == 'right':
-                step = bbox1[2] - bbox0[0]
-                new_x = x0 + step
-                new_y = y0
-            elif direction == 'left':
-                step = bbox0[2] - bbox1[0]
-                new_x = x0 - step
-                new_y = y0
-            elif direction == 'down':
-                step = bbox1[3] - bbox0[1]
-                new_x = x0
-                new_y = y0 + step
-            elif direction == 'up':
-                step = bbox0[3] - bbox1[1]
-                new_x = x0
-                new_y = y0 - step
-            else:
-                continue
-            if not self.boundary_check((new_x, new_y)):
-                continue
+        return rects_overlap(rect1, rect2)
+
+    def auto_arrange(self, event=None):
+        # One-shot skyline packing of the whole board, keeping the current indices
+        centers = skyline_pack([img.size for img in self.images])
+        for img, pos in zip(self.images, centers):
+            img.pos = pos
+        if self.journal is not None:
+            self.journal.commit()
+        if self.canvas is not None:
+            self.redraw()
 
-            if step > 0:
-                dist = abs(new_x - x0) + abs(new_y - y0)
-                if min_step is None or dist < min_step:
-                    min_step = dist
-                    candidate_pos = (new_x, new_y)
-            if candidate_pos and min_step <= min_dist:
-                min_dist = min_step
-                best_pos = candidate_pos
-        return best_pos
-    
     def check_collision_free(self, img=None):
-        collision_free = True
         if img is None:
-            for i, img in enumerate(self.images):
-                other_imgs = self.images[i+1:]
-                bbox = img.get_bbox()
-                for other in other_imgs:
-                    if self.rects_overlap(bbox, other.get_bbox()):
-                        collision_free = False
-                        break
-        else:
-            for other in self.images:
-                if other == img:
-                    continue
-                if self.rects_overlap(img.get_bbox(), other.get_bbox()):
-                    collision_free = False
-                    break
-        return collision_free
-    
-    def append_colfree_list(self, colfree_list, img):
-        for i in range(len(colfree_list)):
-            if self.rects_overlap(img.get_bbox(), colfree_list[i].get_bbox()):
-                return i
-        return -1
+            return not self.geometry.has_overlap()
+        return all(other is img for other in self.geometry.query(img.get_bbox()))
+
+    def find_first_overlap(self, img, order, limit):
+        # Earliest image in `order` before position `limit` that overlaps img, or None
+        hits = [other for other in self.geometry.query(img.get_bbox()) if order[other] < limit]
+        if not hits:
+            return None
+        return min(hits, key=order.__getitem__)
     
+    def unresolved(self, order):
+        # Flags, by position in `order`, the images that are out of bounds or overlap an earlier one
+        rank = np.full(len(self.geometry.keys), len(order))
+        for img, i in order.items():
+            rank[img.row] = i
+        firsts, seconds = self.geometry.overlap_pairs()
+        flagged = np.concatenate((np.maximum(rank[firsts], rank[seconds]), rank[self.geometry.out_of_bounds()]))
+        dirty = np.zeros(len(order) + 1, dtype=bool)
+        dirty[flagged] = True
+        return dirty[:-1]
+
+    @traced("resolve_collisions")
     def resolve_collisions(self, img=None):
         """
         Resolve collisions for all images.
@@ -296,28 +712,29 @@ class CollageCanvas:
             img = self.images.pop(img_idx)
             self.images.append(img)
 
-        max_attempts = 50  # Prevent infinite loops
-        for i in range(len(self.images)):
-            prev_imgs = self.images[:i]
-            if not self.boundary_check(self.images[i].get_bbox()):
-                _img = self.images[i]
+        order = {_img: i for i, _img in enumerate(self.images)}
+        # Only flagged images can move; a moved image flags the later ones it lands on
+        dirty = self.unresolved(order)
+        start = int(np.argmax(dirty)) if dirty.any() else len(self.images)
+        for i in range(start, len(self.images)):
+            if not dirty[i]:
+                continue
+            _img = self.images[i]
+            moved = False
+            if not self.boundary_check(_img.get_bbox()):
                 bbox = _img.get_bbox()
                 x_depth = min(0, bbox[0])
                 y_depth = min(0, bbox[1])
                 _img.pos = (_img.pos[0] - x_depth, _img.pos[1] - y_depth)
-            attempts = 0
-            while len(prev_imgs) > 0 and attempts < max_attempts:
-                colidx = self.append_colfree_list(prev_imgs, self.images[i])
-                if colidx == -1:
-                    break
-                pos = self.find_non_overlapping_position(self.images[i], self.images[i].pos, prev_imgs[colidx])
-                if pos == self.images[i].pos:
-                    # No better position found, break to avoid infinite loop
-                    break
-                self.images[i].pos = pos
-                attempts += 1
-            if attempts >= max_attempts:
-                print(f"Warning: Could not resolve collision for image {i} after {max_attempts} attempts.")
+                moved = True
+            if i > 0 and self.find_first_overlap(_img, order, i) is not None:
+                # Jump to the nearest free spot among the images placed before this one
+                _img.pos = place_near(self.geometry, _img.size, _img.pos, lambda other: order[other] < i)
+                moved = True
+            if moved:
+                for other in self.geometry.query(_img.get_bbox()):
+                    if order.get(other, -1) > i:
+                        dirty[order[other]] = True
 
         if img is not None:
             self.images.pop()
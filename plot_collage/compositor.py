@@ -0,0 +1,227 @@
+import functools
+import math
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+from .image_item import ROI_MIN_PIXELS
+from .instrument import TRACER, traced
+from .render_cache import CACHE, level_scale, resize_region, zoom_level
+
+COMPOSITE_MIN_ITEMS = 200  # boards with at least this many items are drawn as one composited bitmap
+COMPOSITE_POLL_MS = 10  # how often finished LANCZOS resamples are painted in
+BACKGROUND = (255, 255, 255)
+
+
+@functools.lru_cache(maxsize=4)
+def badge_font(size):
+    try:
+        return ImageFont.truetype("DejaVuSans-Bold.ttf", size)
+    except OSError:
+        try:
+            return ImageFont.load_default(size)
+        except TypeError:  # Pillow < 10.1 has only the fixed-size bitmap font
+            return ImageFont.load_default()
+
+
+def intersect(a, b):
+    r = (max(a[0], b[0]), max(a[1], b[1]), min(a[2], b[2]), min(a[3], b[3]))
+    return r if r[0] < r[2] and r[1] < r[3] else None
+
+
+class Compositor:
+    """
+    Draws every visible item of a CollageCanvas, badges included, into one
+    viewport-sized Pillow bitmap shown as a single canvas image.
+    Moves repaint and upload only the dirty rectangles; pans shift the
+    existing pixels and repaint the strips that scrolled in; zooms paint
+    previews first and LANCZOS renders as the render pool delivers them.
+    """
+
+    def __init__(self, board):
+        self.board = board
+        self.canvas = board.canvas
+        self.image = None
+        self.photo = None
+        self.id = None
+        self.origin = None  # canvas coordinates of the bitmap's top-left corner
+        self.scale = None
+        self.previews = {}  # source -> preview at the current level, until the LANCZOS render lands
+        self.jobs = {}  # source -> future of CACHE.resized at the current level
+        self.poll_job = None
+        # Items that were never drawn get a z above everything on the board
+        self.next_z = int(board.geometry.z.max(initial=-1)) + 1
+
+    def close(self):
+        if self.poll_job is not None:
+            self.canvas.after_cancel(self.poll_job)
+            self.poll_job = None
+        for future in self.jobs.values():
+            future.cancel()
+        if self.id is not None:
+            self.canvas.delete(self.id)
+        self.id = self.photo = self.image = None
+
+    @traced("composite")
+    def render(self, fast=False):
+        viewport = tuple(int(v) for v in self.board.get_viewport())
+        scale = self.board.current_scale
+        size = (viewport[2] - viewport[0], viewport[3] - viewport[1])
+        if self.image is not None and scale == self.scale and size == self.image.size:
+            if viewport[:2] != self.origin:
+                self.shift(viewport)
+            return
+        if scale != self.scale:
+            self.previews.clear()
+            for future in self.jobs.values():
+                future.cancel()
+            self.jobs.clear()
+        self.scale = scale
+        self.origin = viewport[:2]
+        self.image = Image.new("RGB", size, BACKGROUND)
+        self.paint(viewport, upload=False)
+        self.upload_all()
+
+    def shift(self, viewport):
+        # Pan: keep the pixels that are still in view and repaint the strips that scrolled in
+        dx, dy = viewport[0] - self.origin[0], viewport[1] - self.origin[1]
+        shifted = Image.new("RGB", self.image.size, BACKGROUND)
+        shifted.paste(self.image, (-dx, -dy))
+        self.image = shifted
+        self.origin = viewport[:2]
+        x0, y0, x1, y1 = viewport
+        if dx:
+            self.paint((x1 - dx, y0, x1, y1) if dx > 0 else (x0, y0, x0 - dx, y1), upload=False)
+        if dy:
+            self.paint((x0, y1 - dy, x1, y1) if dy > 0 else (x0, y0, x1, y0 - dy), upload=False)
+        self.upload_all()
+
+    def upload_all(self):
+        x, y = self.origin
+        self.photo = self.canvas.make_photo(self.image)
+        if self.id is None:
+            self.id = self.canvas.create_image(x, y, image=self.photo, anchor='nw')
+            # The bitmap is opaque; the axes and everything else drawn on the board stay on top
+            self.canvas.tag_lower(self.id)
+        else:
+            self.canvas.itemconfig(self.id, image=self.photo)
+            self.canvas.coords(self.id, x, y)
+
+    def invalidate(self, rect):
+        """Repaint `rect` (scaled canvas coordinates), e.g. the old and new bbox of a moved item."""
+        if self.image is None:
+            return
+        x, y = self.origin
+        rect = intersect(rect, (x, y, x + self.image.width, y + self.image.height))
+        if rect is not None:
+            self.paint(tuple(int(v) for v in (math.floor(rect[0]), math.floor(rect[1]), math.ceil(rect[2]), math.ceil(rect[3]))))
+
+    def item_rect(self, img, pos=None):
+        # The item's bitmap plus its badge, in scaled canvas coordinates; `pos` overrides where it is
+        scale = self.scale
+        level = zoom_level(scale)
+        w, h = int(img.source.width * level_scale(level)), int(img.source.height * level_scale(level))
+        pos = img.pos if pos is None else pos
+        x, y = int(pos[0] * scale), int(pos[1] * scale)
+        return (min(x - w // 2, x - img.r), min(y - h // 2, y - img.r), max(x - w // 2 + w, x + img.r + 1), max(y - h // 2 + h, y + img.r + 1))
+
+    def track(self):
+        """Geometry before a layout change, for `repaint_moved` to compare against."""
+        geometry = self.board.geometry
+        return geometry.x.copy(), geometry.y.copy(), list(geometry.keys)
+
+    def repaint_moved(self, tracked):
+        """Repaint the old and new spot of every item moved since `track()`, and items added since."""
+        if self.image is None:
+            return
+        x, y, keys = tracked
+        geometry = self.board.geometry
+        n = len(keys)
+        moved = np.flatnonzero(geometry.alive[:n] & ((geometry.x[:n] != x) | (geometry.y[:n] != y)))
+        for row in moved:
+            img = geometry.keys[row]
+            if img is keys[row]:
+                self.invalidate(self.item_rect(img, (float(x[row]), float(y[row]))))
+        # Rows that hold a different item now (a reused row) or did not exist yet
+        added = [row for row in np.flatnonzero(geometry.alive) if row >= n or geometry.keys[row] is not keys[row]]
+        for row in set(moved) | set(added):
+            self.invalidate(self.item_rect(geometry.keys[row]))
+
+    def paint(self, rect, upload=True):
+        """Recompose `rect` (scaled canvas coordinates inside the bitmap) from the items under it."""
+        board = self.board
+        scale = self.scale
+        level = zoom_level(scale)
+        lscale = level_scale(level)
+        geometry = board.geometry
+        # Badges reach past small bitmaps, so look a badge radius further
+        r = board.images[0].r if board.images else 0
+        query = ((rect[0] - r) / scale, (rect[1] - r) / scale, (rect[2] + r) / scale, (rect[3] + r) / scale)
+        items = geometry.query(query)
+        for img in items:
+            if geometry.z[img.row] < 0:
+                geometry.z[img.row] = self.next_z
+                self.next_z += 1
+        items.sort(key=lambda img: geometry.z[img.row])
+        tile = Image.new("RGB", (rect[2] - rect[0], rect[3] - rect[1]), BACKGROUND)
+        draw = ImageDraw.Draw(tile)
+        for img in items:
+            x, y = int(img.pos[0] * scale), int(img.pos[1] * scale)
+            w, h = int(img.source.width * lscale), int(img.source.height * lscale)
+            left, top = x - w // 2, y - h // 2
+            visible = intersect((left, top, left + w, top + h), rect)
+            if visible is not None:
+                if w * h > ROI_MIN_PIXELS:
+                    region = (visible[0] - left, visible[1] - top, visible[2] - left, visible[3] - top)
+                    pixels, at = resize_region(img.source, level, region), visible[:2]
+                else:
+                    pixels, at = self.pixels(img, level), (left, top)
+                if pixels is not None:
+                    if pixels.mode in ("RGBA", "LA", "PA"):
+                        pixels = pixels.convert("RGBA")
+                        tile.paste(pixels, (at[0] - rect[0], at[1] - rect[1]), pixels)
+                    else:
+                        tile.paste(pixels, (at[0] - rect[0], at[1] - rect[1]))
+            cx, cy = x - rect[0], y - rect[1]
+            draw.ellipse((cx - img.r, cy - img.r, cx + img.r, cy + img.r), fill="#cccccc", outline="#888888", width=2)
+            font = badge_font(int(img.r * 0.7))
+            b = draw.textbbox((0, 0), str(img.idx), font=font)
+            draw.text((cx - (b[0] + b[2]) / 2, cy - (b[1] + b[3]) / 2), str(img.idx), fill="black", font=font)
+        at = (rect[0] - self.origin[0], rect[1] - self.origin[1])
+        self.image.paste(tile, at)
+        if upload and self.photo is not None:
+            with TRACER.span("update_photo", tile.width * tile.height * 4):
+                self.canvas.update_photo(self.photo, tile, at)
+
+    def pixels(self, img, level):
+        # The cached LANCZOS render, else a preview while the render pool produces it
+        source = img.source
+        pixels = CACHE.get(source, level)
+        if pixels is not None:
+            return pixels
+        pool = self.board.pool
+        if pool is None:
+            return CACHE.resized(source, level)
+        if source not in self.jobs:
+            self.jobs[source] = pool.executor.submit(CACHE.resized, source, level)
+            if self.poll_job is None:
+                self.poll_job = self.canvas.after(COMPOSITE_POLL_MS, self.poll)
+        preview = self.previews.get(source)
+        if preview is None:
+            preview = self.previews[source] = CACHE.preview(source, level)
+        return preview
+
+    def poll(self):
+        self.poll_job = None
+        done = set()
+        for source in [source for source, future in self.jobs.items() if future.done()]:
+            future = self.jobs.pop(source)
+            self.previews.pop(source, None)
+            if not future.cancelled() and future.exception() is None:
+                done.add(source)
+        if done and self.image is not None:
+            x, y = self.origin
+            view = (x / self.scale, y / self.scale, (x + self.image.width) / self.scale, (y + self.image.height) / self.scale)
+            for img in self.board.geometry.query(view):
+                if img.source in done:
+                    self.invalidate(self.item_rect(img))
+        if self.jobs:
+            self.poll_job = self.canvas.after(COMPOSITE_POLL_MS, self.poll)
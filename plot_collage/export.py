@@ -0,0 +1,213 @@
+import io
+import struct
+import subprocess
+import threading
+import zlib
+from PIL import Image
+from .instrument import TRACER, traced
+from .render_cache import CACHE, level_scale
+
+STRIP_HEIGHT = 256  # output rows composed at a time
+BACKGROUND = (255, 255, 255, 0)
+ENCODINGS = ("fast", "default", "optimized", "webp")
+PNG_COMPRESS_LEVELS = {"fast": 1, "default": 6, "optimized": 9}
+PNG_COMPRESS_LEVEL = PNG_COMPRESS_LEVELS["default"]
+WEBP_MAX_SIDE = 16383  # larger collages fall back to PNG
+
+
+class ExportCancelled(Exception):
+    pass
+
+
+def snapshot(images):
+    # Positions are captured on the Tk thread so a drag during export cannot tear the layout
+    return [(img, img.pos) for img in images]
+
+
+@traced("collect layers")
+def collect_layers(placements, level=None, executor=None):
+    """
+    Turn (image item, pos) placements into paint layers (pixels, left, top) plus the output size.
+    Pixels are a PIL image or an ImageSource whose full resolution is loaded lazily.
+    With a zoom `level` every image is downscaled through the render cache (in
+    parallel when an executor is given), so exporting at the current zoom reuses
+    the bitmaps already shown on screen.
+    """
+    if not placements:
+        return [], (0, 0)
+    scale = 1.0 if level is None else level_scale(level)
+    images = [img for img, _ in placements]
+    if level is None:
+        # Full-resolution sources are only read when their strip comes up
+        pixels = [img.source for img in images]
+    elif executor is None:
+        pixels = [CACHE.resized(img.source, level) for img in images]
+    else:
+        pixels = list(executor.map(lambda img: CACHE.resized(img.source, level), images))
+    bboxes = [img.get_bbox_at(pos) for img, pos in placements]
+    min_x = min(b[0] for b in bboxes) * scale
+    min_y = min(b[1] for b in bboxes) * scale
+    max_x = max(b[2] for b in bboxes) * scale
+    max_y = max(b[3] for b in bboxes) * scale
+    layers = []
+    for (img, pos), pil in zip(placements, pixels):
+        if pil is None:
+            continue
+        x, y = pos[0] * scale, pos[1] * scale
+        layers.append((pil, int(x - pil.width // 2 - min_x), int(y - pil.height // 2 - min_y)))
+    return layers, (int(max_x - min_x), int(max_y - min_y))
+
+
+def iter_strips(layers, size, strip_height=STRIP_HEIGHT):
+    """
+    Yield the collage as RGBA strips from top to bottom.
+    Each strip only has the layers that intersect it pasted in, so at most one
+    strip of output pixels is alive at a time.
+    """
+    width, height = size
+    # Sweep the layers by their top edge, keeping the ones still reaching into the current strip
+    placed = sorted(((top, order, left, pil) for order, (pil, left, top) in enumerate(layers)), key=lambda p: (p[0], p[1]))
+    active = []
+    loaded = {}  # ImageSource -> full-resolution pixels, shared by every layer showing it
+    nxt = 0
+    for strip_top in range(0, height, strip_height):
+        strip_bottom = min(strip_top + strip_height, height)
+        while nxt < len(placed) and placed[nxt][0] < strip_bottom:
+            active.append(placed[nxt])
+            nxt += 1
+        active = [p for p in active if p[0] + p[3].height > strip_top]
+        # Load full-resolution pixels only for the layers alive in this strip
+        sources = {p[3] for p in active if not isinstance(p[3], Image.Image)}
+        loaded = {source: loaded[source] if source in loaded else source.full() for source in sources}
+        strip = Image.new("RGBA", (width, strip_bottom - strip_top), BACKGROUND)
+        for top, _, left, pil in sorted(active, key=lambda p: p[1]):
+            if not isinstance(pil, Image.Image):
+                pil = loaded[pil]
+            # Only the rows inside the strip are converted; palette rows go straight to the strip's RGBA
+            y0 = max(0, strip_top - top)
+            part = pil.crop((0, y0, pil.width, min(pil.height, strip_bottom - top)))
+            masked = part.mode in ('RGBA', 'LA')
+            if part.mode == 'P':
+                masked = 'transparency' in part.info or part.palette.mode == 'RGBA'
+                part = part.convert('RGBA')
+            strip.paste(part, (left, top + y0 - strip_top), part if masked else None)
+        yield strip
+
+
+class PNGStreamWriter:
+    """Writes an RGBA PNG row strip by row strip to a binary file object."""
+
+    def __init__(self, fp, width, height, compress_level=PNG_COMPRESS_LEVEL):
+        self.fp = fp
+        self.width = width
+        self.compressor = zlib.compressobj(compress_level)
+        self.fp.write(b"\x89PNG\r\n\x1a\n")
+        # 8 bits per channel, color type 6 (RGBA), default compression/filter, no interlace
+        self._chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 6, 0, 0, 0))
+
+    def _chunk(self, tag, data):
+        self.fp.write(struct.pack(">I", len(data)))
+        self.fp.write(tag)
+        self.fp.write(data)
+        self.fp.write(struct.pack(">I", zlib.crc32(data, zlib.crc32(tag))))
+
+    def write_strip(self, strip):
+        stride = self.width * 4
+        raw = strip.tobytes()
+        # Every scanline is prefixed with filter type 0 (None)
+        rows = b"".join(b"\x00" + raw[i:i + stride] for i in range(0, len(raw), stride))
+        data = self.compressor.compress(rows)
+        if data:
+            self._chunk(b"IDAT", data)
+
+    def close(self):
+        self._chunk(b"IDAT", self.compressor.flush())
+        self._chunk(b"IEND", b"")
+
+
+def write_collage_png(layers, size, fp, strip_height=STRIP_HEIGHT, compress_level=PNG_COMPRESS_LEVEL, progress=None, cancel=None):
+    writer = PNGStreamWriter(fp, size[0], size[1], compress_level)
+    for i, strip in enumerate(iter_strips(layers, size, strip_height)):
+        if cancel is not None and cancel.is_set():
+            raise ExportCancelled()
+        writer.write_strip(strip)
+        if progress is not None:
+            progress(min(1.0, (i + 1) * strip_height / size[1]))
+    writer.close()
+
+
+@traced("encode")
+def encode_collage(layers, size, encoding="default", progress=None, cancel=None):
+    """Encode the collage and return (data, mime type)."""
+    output = io.BytesIO()
+    if encoding == "webp" and max(size) <= WEBP_MAX_SIDE:
+        # WebP has no incremental encoder in Pillow, so the strips are joined first
+        collage = Image.new("RGBA", size, BACKGROUND)
+        for i, strip in enumerate(iter_strips(layers, size)):
+            if cancel is not None and cancel.is_set():
+                raise ExportCancelled()
+            collage.paste(strip, (0, i * STRIP_HEIGHT))
+            if progress is not None:
+                progress(min(1.0, (i + 1) * STRIP_HEIGHT / size[1]))
+        collage.save(output, "WEBP", lossless=True, method=0)
+        TRACER.add_bytes("encode", output.tell())
+        return output.getvalue(), "image/webp"
+    level = PNG_COMPRESS_LEVELS.get(encoding, PNG_COMPRESS_LEVEL)
+    write_collage_png(layers, size, output, compress_level=level, progress=progress, cancel=cancel)
+    TRACER.add_bytes("encode", output.tell())
+    return output.getvalue(), "image/png"
+
+
+def copy_to_clipboard(data, mime):
+    p = subprocess.Popen(['xclip', '-selection', 'clipboard', '-t', mime, '-i'], stdin=subprocess.PIPE)
+    p.communicate(data)
+    if p.returncode:
+        raise RuntimeError(f"xclip exited with status {p.returncode}")
+
+
+class ExportJob:
+    """
+    Composes, encodes and delivers a collage on a background thread.
+    The Tk loop polls `progress` and `done`; `cancel()` stops at the next strip.
+    `prepare` runs first on the worker and returns (layers, size), so per-image
+    downscaling happens off the Tk thread too. A `result` from an earlier job
+    with the same layout skips straight to `deliver`.
+    """
+
+    def __init__(self, prepare, encoding="default", deliver=copy_to_clipboard, result=None):
+        self.prepare = prepare
+        self.encoding = encoding
+        self.deliver = deliver
+        self.progress = 0.0
+        self.result = result  # (data, mime type)
+        self.error = None
+        self.done = False
+        self._cancel = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="export", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def cancel(self):
+        self._cancel.set()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def _set_progress(self, value):
+        self.progress = value
+
+    def _run(self):
+        try:
+            if self.result is None:
+                layers, size = self.prepare()
+                self.result = encode_collage(layers, size, self.encoding, self._set_progress, self._cancel)
+            self.progress = 1.0
+            if self.deliver is not None:
+                self.deliver(*self.result)
+        except Exception as e:
+            self.error = e
+        finally:
+            self.done = True
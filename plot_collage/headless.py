@@ -0,0 +1,105 @@
+import glob
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from PIL import Image
+from .collage_canvas import CollageCanvas
+from .export import ENCODINGS, PNG_COMPRESS_LEVELS, collect_layers, encode_collage, snapshot, write_collage_png
+from .image_item import ImageItem
+from .source import IMAGES, normalize
+
+
+def load_image(path):
+    # Runs in a worker process, which also compacts and hashes the pixels, so only
+    # the (digest, compact image) pair is pickled back to the parent
+    with Image.open(path) as img:
+        img.load()
+    return normalize(img)
+
+
+def expand_inputs(patterns):
+    paths = []
+    seen = set()
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern, recursive=True)) or ([pattern] if os.path.isfile(pattern) else [])
+        for path in matches:
+            if path not in seen:
+                seen.add(path)
+                paths.append(path)
+    return paths
+
+
+def decode_all(paths, workers=None):
+    """
+    One shared ImageSource per path. Nothing is displayed, so there are no
+    proxies; each image goes to the spill file as it arrives and the decoded
+    pixels are dropped, so memory does not grow with the number of inputs.
+    Duplicate inputs share one source.
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        # No pickling round trip when there is nothing to run in parallel
+        return [IMAGES.intern(img, digest=digest, proxy_scale=None) for digest, img in map(load_image, paths)]
+    chunksize = max(1, len(paths) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return [IMAGES.intern(img, digest=digest, proxy_scale=None) for digest, img in executor.map(load_image, paths, chunksize=chunksize)]
+
+
+def build_board(sources):
+    board = CollageCanvas(None)
+    for i, source in enumerate(sources):
+        board.images.append(ImageItem(source, (0, 0), i, None, board.geometry))
+    board.auto_arrange()
+    return board
+
+
+def write_collage(board, output, encoding="default"):
+    layers, size = collect_layers(snapshot(board.images))
+    if output.lower().endswith(".webp"):
+        data, _ = encode_collage(layers, size, "webp")
+        with open(output, "wb") as fp:
+            fp.write(data)
+        return
+    # PNG is streamed strip by strip straight into the file
+    with open(output, "wb") as fp:
+        write_collage_png(layers, size, fp, compress_level=PNG_COMPRESS_LEVELS.get(encoding, PNG_COMPRESS_LEVELS["default"]))
+
+
+def compose(patterns, output, encoding="default", workers=None):
+    timings = []
+    start = time.perf_counter()
+    paths = expand_inputs(patterns)
+    if not paths:
+        print("No input images matched.")
+        return 1
+    timings.append(("expand", time.perf_counter() - start))
+
+    start = time.perf_counter()
+    sources = decode_all(paths, workers)
+    timings.append(("decode", time.perf_counter() - start))
+
+    start = time.perf_counter()
+    board = build_board(sources)
+    del sources  # the board's items hold the sources now
+    timings.append(("layout", time.perf_counter() - start))
+
+    start = time.perf_counter()
+    write_collage(board, output, encoding)
+    timings.append(("compose+encode", time.perf_counter() - start))
+
+    print(f"{len(paths)} images -> {output}")
+    items, distinct, saved = IMAGES.stats()
+    if distinct < items:
+        print(f"  {items - distinct} duplicate images deduplicated, {saved / 2**20:.1f} MiB saved")
+    for stage, elapsed in timings:
+        print(f"  {stage:<15} {elapsed:8.3f} s")
+    return 0
+
+
+def add_compose_parser(subparsers):
+    parser = subparsers.add_parser("compose", help="lay out images without a display and write the collage to a file")
+    parser.add_argument("inputs", nargs="+", help="image files or glob patterns (quote them to avoid shell expansion limits)")
+    parser.add_argument("-o", "--output", required=True, help="output .png or .webp file")
+    parser.add_argument("--encoding", choices=[e for e in ENCODINGS if e != "webp"], default="default", help="PNG compression speed")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="decode processes (default: CPU count)")
+    parser.set_defaults(run=lambda args: compose(args.inputs, args.output, args.encoding, args.workers))
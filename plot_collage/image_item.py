@@ -1,63 +1,232 @@
-from PIL import Image, ImageTk
+import math
+import weakref
+from .instrument import TRACER, traced
+from .render_cache import CACHE, level_scale, resize_region, zoom_level
+from .source import IMAGES, as_source
+from .spatial_index import GeometryStore
+
+# LANCZOS photos shared by the items showing the same source at the same level
+PHOTOS = weakref.WeakValueDictionary()  # (canvas, source, level) -> photo
+ROI_MIN_PIXELS = 4 * 2**20  # zoomed bitmaps larger than this only render the part near the viewport
+ROI_TILE = 256  # the rendered region snaps outwards to this many screen pixels, so small pans reuse it
+
 
 class ImageItem:
-    def __init__(self, pil_image, pos, idx, canvas):
-        self.pil = pil_image
-        self._pos = pos  # logical (unscaled) coordinates
+    # Geometry lives in a row of the board's GeometryStore; the item is a view onto it
+    __slots__ = (
+        "source", "store", "row", "photo", "photo_level", "photo_refined", "rendered_at", "roi",
+        "id", "circle_id", "text_id", "idx", "canvas", "pool", "r",
+    )
+
+    def __init__(self, image, pos, idx, canvas, store=None, pool=None):
+        self.source = as_source(image)  # PIL image or ImageSource; rendering reads its display proxy
+        IMAGES.acquire(self.source)
+        self.store = store if store is not None else GeometryStore(1)
+        self.row = self.store.insert(self, pos, self.source.size)  # pos is in logical (unscaled) coordinates
         self.photo = None
+        self.photo_level = None
+        self.photo_refined = False  # False while the photo is a fast zoom preview
+        self.rendered_at = None  # (x, y, level) of the last render, None while culled
+        self.roi = None  # (level, region, viewport) while only a region of the zoomed image is shown
         self.id = None
         self.circle_id = None
         self.text_id = None
         self.idx = idx
         self.canvas = canvas
+        self.pool = pool  # background RenderPool for LANCZOS passes, None renders inline
         self.r = 60
 
-    def render(self, global_scale):
+    @traced("render")
+    def render(self, global_scale, fast=False, viewport=None):
+        # fast=True accepts a cheap preview resample; a later full render refines it.
+        # `viewport` (scaled canvas coordinates) enables region rendering of very large bitmaps.
         x, y = int(self.pos[0] * global_scale), int(self.pos[1] * global_scale)
-        w, h = int(self.pil.width * global_scale), int(self.pil.height * global_scale)
-        if w < 1 or h < 1:
+        level = zoom_level(global_scale)
+        refine = not fast and not self.photo_refined
+        region = self.visible_region(x, y, level, viewport)
+        if region is not None:
+            self.render_region(x, y, level, region, viewport, fast)
+            return
+        if self.roi is not None:
+            # Back to whole-image rendering: the region photo cannot be reused
+            self.roi = None
+            self.photo_level = None
+        elif (x, y, level) == self.rendered_at and not refine:
             return
-        resized = self.pil.resize((w, h), Image.LANCZOS)
-        self.photo = ImageTk.PhotoImage(resized)
+        shown = self.rendered_at is not None
+        if level != self.photo_level or refine:
+            resized = CACHE.get(self.source, level)
+            refined = resized is not None
+            if resized is None and not fast and self.pool is None:
+                resized = CACHE.resized(self.source, level)
+                refined = True
+            if resized is None and level != self.photo_level:
+                # Show a preview now; the pool (or a later full render) refines it
+                resized = CACHE.preview(self.source, level)
+                if resized is None:
+                    return
+            if resized is not None:
+                self.photo = self.make_photo(resized, level if refined else None)
+                self.photo_level = level
+                self.photo_refined = refined
+            if not self.photo_refined and not fast and self.pool is not None:
+                self.pool.submit(self, level)
+        self.show_photo(x, y, 'center')
+        self.draw_badge(x, y, shown)
+        self.rendered_at = (x, y, level)
+
+    def visible_region(self, x, y, level, viewport):
+        """
+        Part of the zoomed bitmap (in its own pixel coordinates) to render when it
+        is too large to resize whole, or None to render the whole image.
+        """
+        if viewport is None:
+            return None
+        scale = level_scale(level)
+        w, h = int(self.source.width * scale), int(self.source.height * scale)
+        if w * h <= ROI_MIN_PIXELS:
+            return None
+        left, top = x - w // 2, y - h // 2
+        region = (
+            max(0, math.floor((viewport[0] - left) / ROI_TILE) * ROI_TILE),
+            max(0, math.floor((viewport[1] - top) / ROI_TILE) * ROI_TILE),
+            min(w, math.ceil((viewport[2] - left) / ROI_TILE) * ROI_TILE),
+            min(h, math.ceil((viewport[3] - top) / ROI_TILE) * ROI_TILE),
+        )
+        if region[0] >= region[2] or region[1] >= region[3] or region == (0, 0, w, h):
+            return None
+        return region
+
+    def render_region(self, x, y, level, region, viewport, fast):
+        # Resample only `region` of the zoomed image and pin its top-left corner in place
+        shown = self.rendered_at is not None
+        if self.roi is None or self.roi[:2] != (level, region) or not (fast or self.photo_refined):
+            with TRACER.span("render region"):
+                pixels = resize_region(self.source, level, region, fast)
+            self.photo = self.make_photo(pixels)
+            self.photo_level = level
+            self.photo_refined = not fast
+        self.roi = (level, region, viewport)
+        scale = level_scale(level)
+        w, h = int(self.source.width * scale), int(self.source.height * scale)
+        self.show_photo(x - w // 2 + region[0], y - h // 2 + region[1], 'nw')
+        self.draw_badge(x, y, shown)
+        self.rendered_at = (x, y, level)
+
+    def show_photo(self, x, y, anchor):
         if self.id is None:
-            self.id = self.canvas.create_image(x, y, image=self.photo)
+            self.id = self.canvas.create_image(x, y, image=self.photo, anchor=anchor)
+            self.store.z[self.row] = self.id  # later canvas items are drawn on top
         else:
-            self.canvas.itemconfig(self.id, image=self.photo)
+            self.canvas.itemconfig(self.id, image=self.photo, state='normal', anchor=anchor)
             self.canvas.coords(self.id, x, y)
 
+    def draw_badge(self, x, y, shown):
         # Always (re)draw the circle and text
         if self.circle_id is not None:
             self.canvas.coords(self.circle_id, x - self.r, y - self.r, x + self.r, y + self.r)
+            if not shown:
+                self.canvas.itemconfig(self.circle_id, state='normal')
         else:
             self.circle_id = self.canvas.create_oval(x - self.r, y - self.r, x + self.r, y + self.r, fill="#cccccc", outline="#888888", width=2)
         if self.text_id is not None:
             self.canvas.coords(self.text_id, x, y)
-            self.canvas.itemconfig(self.text_id, text=str(self.idx))
+            self.canvas.itemconfig(self.text_id, text=str(self.idx), state='normal')
         else:
             self.text_id = self.canvas.create_text(x, y, text=str(self.idx), fill="black", font=("Arial", int(self.r * 0.7), "bold"))
 
+    def finish_render(self, level, resized):
+        # Called on the Tk thread with a LANCZOS bitmap produced by the render pool
+        if self.rendered_at is None or self.roi is not None or self.photo_level != level or self.photo_refined:
+            return
+        self.photo = self.make_photo(resized, level)
+        self.photo_refined = True
+        self.canvas.itemconfig(self.id, image=self.photo)
+
+    def make_photo(self, resized, level=None):
+        # Refined photos (a `level` is given) are shared; previews belong to one item
+        key = (self.canvas, self.source, level)
+        photo = PHOTOS.get(key) if level is not None else None
+        if photo is None:
+            with TRACER.span("make_photo", resized.width * resized.height * 4):
+                photo = self.canvas.make_photo(resized)
+            if level is not None:
+                PHOTOS[key] = photo
+        return photo
+
+    def place(self, global_scale):
+        # Move the existing canvas items without touching pixels (drag fast path)
+        if self.roi is not None:
+            # The region depends on where the item is relative to the viewport
+            self.render(global_scale, viewport=self.roi[2])
+            return
+        if self.rendered_at is None or self.rendered_at[2] != zoom_level(global_scale):
+            self.render(global_scale)
+            return
+        x, y = int(self.pos[0] * global_scale), int(self.pos[1] * global_scale)
+        self.canvas.coords(self.id, x, y)
+        self.canvas.coords(self.circle_id, x - self.r, y - self.r, x + self.r, y + self.r)
+        self.canvas.coords(self.text_id, x, y)
+        self.rendered_at = (x, y, self.rendered_at[2])
+
+    def set_source(self, image):
+        # Swap the pixels in place (same position and index); the old source's renders go with its last item
+        source = as_source(image)
+        IMAGES.acquire(source)
+        IMAGES.release(self.source)
+        self.source = source
+        self.photo_level = None
+        self.photo_refined = False
+        self.rendered_at = None
+        self.roi = None
+        self.store.set_size(self.row, self.source.size)
+
+    def set_idx(self, idx):
+        self.idx = idx
+        if self.text_id is not None:
+            self.canvas.itemconfig(self.text_id, text=str(idx))
+
+    def delete(self):
+        for item_id in (self.id, self.circle_id, self.text_id):
+            if item_id is not None:
+                self.canvas.delete(item_id)
+        self.id = self.circle_id = self.text_id = None
+        self.photo = None
+        self.store.remove(self)
+        IMAGES.release(self.source)
+
+    def cull(self):
+        # Off-screen: drop the bitmap and hide the canvas items until the next render
+        if self.rendered_at is None:
+            return
+        self.photo = None
+        self.photo_level = None
+        self.photo_refined = False  # False while the photo is a fast zoom preview
+        self.rendered_at = None
+        self.roi = None
+        if self.id is not None:
+            self.canvas.itemconfig(self.id, image='', state='hidden')
+        for item_id in (self.circle_id, self.text_id):
+            if item_id is not None:
+                self.canvas.itemconfig(item_id, state='hidden')
+
+    @property
+    def size(self):
+        return self.source.size
+
     def get_bbox(self):
-        x, y = self.pos
-        w, h = self.pil.width, self.pil.height
-        return (x - w // 2, y - h // 2, x + w // 2, y + h // 2)
+        return self.store.bbox_of(self.row)
 
     def get_bbox_at(self, pos):
         x, y = pos
-        w, h = self.pil.width, self.pil.height
+        w, h = self.source.width, self.source.height
         return (x - w // 2, y - h // 2, x + w // 2, y + h // 2)
 
     @property
     def pos(self):
-        return self._pos
+        return self.store.pos(self.row)
 
     @pos.setter
     def pos(self, pos):
-        self._pos = pos
-        if self.id is not None:
-            self.canvas.coords(self.id, pos[0], pos[1])
-        # Update the text position
-        if self.text_id is not None:
-            self.canvas.coords(self.text_id, pos[0], pos[1])
-        # Update the circle position
-        if self.circle_id is not None:
-            self.canvas.coords(self.circle_id, pos[0] - self.r, pos[1] - self.r, pos[0] + self.r, pos[1] + self.r)
+        # Logical position only; canvas items follow on the next render()/place()
+        self.store.set_pos(self.row, pos)
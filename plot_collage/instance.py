@@ -0,0 +1,94 @@
+"""
+Single-instance mode, client side: later `plot-collage` invocations hand
+their request to the board that is already running (see server.py) and
+exit. This runs before anything else is imported, so it sticks to modules
+that are cheap to load: no argparse, json or re, and the C `_socket`
+rather than `socket`, which pulls in selectors and enum.
+"""
+import _socket
+import os
+import stat
+import sys
+
+SOCKET_ENV = "PLOT_COLLAGE_SOCKET"  # overrides the socket path
+CONNECT_TIMEOUT = 2.0  # seconds per socket operation; a hung instance must not hang the client
+FORWARDED = ("add", "open", "watch")  # subcommands a running board can take over
+HEADER_DIGITS = 8  # a request starts with its header length in ASCII digits
+OK = b"ok"
+
+
+def socket_path():
+    path = os.environ.get(SOCKET_ENV)
+    if path:
+        return path
+    runtime = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime:
+        return os.path.join(runtime, "plot-collage.sock")
+    directory = os.path.join("/tmp", f"plot-collage-{os.getuid()}")
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    # Another user may have created it first, to receive the paths and images sent through it
+    st = os.lstat(directory)
+    if not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid() or stat.S_IMODE(st.st_mode) != 0o700:
+        raise PermissionError(f"{directory} is not a private directory of this user; set {SOCKET_ENV} or XDG_RUNTIME_DIR")
+    return os.path.join(directory, "socket")
+
+
+def request_for(argv):
+    """
+    (command, paths, payload bytes) a running board should handle for this
+    command line, or None for what runs in this process (compose, options, help).
+    `add -` sends image bytes read from stdin along with the request.
+    """
+    if not argv:
+        return "show", [], b""
+    command, args = argv[0], argv[1:]
+    if command not in FORWARDED or not args or any(arg.startswith("-") and arg != "-" for arg in args):
+        return None
+    if command == "open" and len(args) != 1:
+        return None
+    data = sys.stdin.buffer.read() if command == "add" and "-" in args else b""
+    return command, [os.path.abspath(arg) for arg in args if arg != "-"], data
+
+
+def encode_request(command, paths, data=b""):
+    # <header length><command NUL payload length NUL path NUL path ...><payload>
+    header = b"\0".join([command.encode(), str(len(data)).encode(), *(os.fsencode(p) for p in paths)])
+    return str(len(header)).zfill(HEADER_DIGITS).encode() + header + data
+
+
+def read_request(stream):
+    """(command, paths, payload) from a binary file object, the inverse of encode_request."""
+    header = stream.read(int(stream.read(HEADER_DIGITS)))
+    command, length, *paths = header.split(b"\0")
+    return command.decode(), [os.fsdecode(p) for p in paths], stream.read(int(length))
+
+
+def forward(command, paths, data=b""):
+    """
+    Hand a request to the running board and return the exit status, or None
+    if there is no running board to take it.
+    """
+    client = _socket.socket(_socket.AF_UNIX, _socket.SOCK_STREAM)
+    client.settimeout(CONNECT_TIMEOUT)
+    try:
+        client.connect(socket_path())
+    except OSError:
+        client.close()
+        return None
+    try:
+        client.sendall(encode_request(command, paths, data))
+        client.shutdown(_socket.SHUT_WR)
+        reply = b""
+        while chunk := client.recv(4096):
+            reply += chunk
+    except OSError as e:
+        # A board is running but did not take the request; starting a second one would not help
+        print(f"plot-collage: the running board did not answer ({e}); try again", file=sys.stderr)
+        return 1
+    finally:
+        client.close()
+    reply = reply.strip()
+    if reply != OK:
+        print("plot-collage:", reply.decode(errors="replace"), file=sys.stderr)
+        return 1
+    return 0
@@ -0,0 +1,178 @@
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+
+TRACE_ENV = "PLOT_COLLAGE_TRACE"  # set to enable at startup; a value other than "1" is the dump path
+TRACE_FILE = "plot-collage-trace.json"
+TRACE_MAX_EVENTS = 200_000  # oldest events are dropped beyond this
+OVERLAY_MS = 250  # overlay refresh and event-loop lag probe interval
+
+
+class Tracer:
+    """
+    Records durations, call counts and bytes per span name, plus a bounded
+    list of Chrome trace events ("ph": "X") that chrome://tracing or Perfetto
+    open directly. Spans can be recorded from any thread.
+    Disabled, a traced call costs one attribute check.
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.stats = {}  # name -> [count, total seconds, max seconds, bytes]
+        self.events = deque(maxlen=TRACE_MAX_EVENTS)
+        self.frame = 0.0  # longest outermost span on the main thread since the last take_frame()
+        self._origin = time.perf_counter()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def span(self, name, nbytes=0):
+        return _Span(self, name, nbytes) if self.enabled else _NO_SPAN
+
+    def add_bytes(self, name, nbytes):
+        if self.enabled:
+            with self._lock:
+                self._stat(name)[3] += nbytes
+
+    def record(self, name, start, duration, nbytes=0):
+        with self._lock:
+            stat = self._stat(name)
+            stat[0] += 1
+            stat[1] += duration
+            stat[2] = max(stat[2], duration)
+            stat[3] += nbytes
+        event = {
+            "name": name, "ph": "X", "pid": os.getpid(), "tid": threading.get_ident(),
+            "ts": (start - self._origin) * 1e6, "dur": duration * 1e6,
+        }
+        if nbytes:
+            event["args"] = {"bytes": nbytes}
+        self.events.append(event)
+
+    def _stat(self, name):
+        stat = self.stats.get(name)
+        if stat is None:
+            stat = self.stats[name] = [0, 0.0, 0.0, 0]
+        return stat
+
+    def take_frame(self):
+        frame, self.frame = self.frame, 0.0
+        return frame
+
+    def reset(self):
+        with self._lock:
+            self.stats.clear()
+            self.events.clear()
+            self.frame = 0.0
+
+    def dump(self, path=TRACE_FILE):
+        with open(path, "w") as f:
+            json.dump({"traceEvents": list(self.events), "displayTimeUnit": "ms"}, f)
+
+    def summary(self):
+        lines = [f"{'span':<28}{'count':>8}{'total ms':>12}{'mean ms':>10}{'max ms':>10}{'MiB':>10}"]
+        for name, (count, total, peak, nbytes) in sorted(self.stats.items(), key=lambda s: -s[1][1]):
+            mean = total / count if count else 0.0
+            lines.append(f"{name:<28}{count:>8}{total * 1e3:>12.1f}{mean * 1e3:>10.2f}{peak * 1e3:>10.2f}{nbytes / 2**20:>10.1f}")
+        return "\n".join(lines)
+
+
+class _Span:
+    __slots__ = ("tracer", "name", "nbytes", "start")
+
+    def __init__(self, tracer, name, nbytes):
+        self.tracer = tracer
+        self.name = name
+        self.nbytes = nbytes
+
+    def __enter__(self):
+        local = self.tracer._local
+        local.depth = getattr(local, "depth", 0) + 1
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        duration = time.perf_counter() - self.start
+        tracer = self.tracer
+        tracer.record(self.name, self.start, duration, self.nbytes)
+        local = tracer._local
+        local.depth -= 1
+        if local.depth == 0 and threading.current_thread() is threading.main_thread():
+            tracer.frame = max(tracer.frame, duration)
+        return False
+
+
+class _NoSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+TRACER = Tracer(enabled=bool(os.environ.get(TRACE_ENV)))
+
+
+def traced(name):
+    """Decorator recording every call of the function as span `name` while TRACER is enabled."""
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not TRACER.enabled:
+                return func(*args, **kwargs)
+            with _Span(TRACER, name, 0):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def trace_path():
+    value = os.environ.get(TRACE_ENV)
+    return value if value and value != "1" else TRACE_FILE
+
+
+class Overlay:
+    """
+    Text in the top-left corner of the window with the longest frame (outermost
+    main-thread span) and the event-loop lag of the last OVERLAY_MS interval.
+    Lag is how late the periodic probe callback fires.
+    """
+
+    def __init__(self, canvas, tracer=TRACER):
+        self.canvas = canvas
+        self.tracer = tracer
+        self.text_id = None
+        self.job = None
+        self.due = None
+
+    def start(self):
+        if self.job is not None:
+            return
+        self.text_id = self.canvas.create_text(0, 0, anchor="nw", text="", fill="#c00000", font=("Courier", 12, "bold"))
+        self._schedule()
+
+    def stop(self):
+        if self.job is not None:
+            self.canvas.after_cancel(self.job)
+            self.job = None
+        if self.text_id is not None:
+            self.canvas.delete(self.text_id)
+            self.text_id = None
+
+    def _schedule(self):
+        self.due = time.perf_counter() + OVERLAY_MS / 1000
+        self.job = self.canvas.after(OVERLAY_MS, self._tick)
+
+    def _tick(self):
+        lag = max(0.0, time.perf_counter() - self.due)
+        frame = self.tracer.take_frame()
+        self.canvas.coords(self.text_id, self.canvas.canvasx(8), self.canvas.canvasy(8))
+        self.canvas.tag_raise(self.text_id)
+        self.canvas.itemconfig(self.text_id, text=f"frame {frame * 1e3:6.1f} ms  lag {lag * 1e3:6.1f} ms")
+        self._schedule()
@@ -0,0 +1,306 @@
+import fcntl
+import json
+import os
+import numpy as np
+from .clipboard import decode
+from .session import encode_blob, write_atomic
+from .source import IMAGES, ImageSource, content_digest
+
+JOURNAL_ENV = "PLOT_COLLAGE_STATE"  # overrides the state directory
+JOURNAL_FILE = "journal.jsonl"
+CHECKPOINT_FILE = "checkpoint.json"
+BLOB_DIR = "blobs"  # one encoded image per content hash, shared by the checkpoint and the journal
+LOCK_FILE = "lock"
+COMPACT_EVERY = 500  # journal lines between checkpoints
+UNDO_LIMIT = 200  # steps kept for undo, also across restarts
+
+
+def state_dir():
+    path = os.environ.get(JOURNAL_ENV)
+    if path:
+        return path
+    base = os.environ.get("XDG_STATE_HOME") or os.path.join(os.path.expanduser("~"), ".local", "state")
+    return os.path.join(base, "plot-collage")
+
+
+def inverse(changes):
+    undone = []
+    for change in reversed(changes):
+        if change["op"] == "move":
+            undone.append({**change, "from": change["to"], "to": change["from"]})
+        else:
+            undone.append({**change, "op": "remove" if change["op"] == "add" else "add"})
+    return undone
+
+
+class Journal:
+    """
+    Autosave for one board: a checkpoint of the whole layout plus an
+    append-only JSONL log of the steps taken since. A step is the list of
+    changes one user action made (item added, removed, moved); undo and redo
+    are logged as single words and replayed like the original actions.
+    Images are stored once per content hash under blobs/ and referenced by
+    hash, so no step, undo or checkpoint copies pixels.
+
+    Every COMPACT_EVERY lines the log is folded into a new checkpoint. Both
+    carry a generation number; a log left over from an older generation
+    (a crash between writing the checkpoint and the new log) is ignored.
+    """
+
+    def __init__(self, directory=None):
+        self.dir = directory or state_dir()
+        os.makedirs(os.path.join(self.dir, BLOB_DIR), exist_ok=True)
+        # One window per journal; a second one raises BlockingIOError
+        self.lock = open(os.path.join(self.dir, LOCK_FILE), "a")
+        try:
+            fcntl.flock(self.lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            self.lock.close()
+            raise BlockingIOError(f"{self.dir} is in use by another plot-collage window")
+        self.board = None
+        self.file = None
+        self.generation = 0
+        self.lines = 0
+        self.next_uid = 0
+        self.uids = {}  # item -> uid
+        self.items = {}  # uid -> item
+        self.undo_steps = []
+        self.redo_steps = []
+        self.x = self.y = np.zeros(0)  # geometry positions as of the last journaled step
+
+    def path(self, name):
+        return os.path.join(self.dir, name)
+
+    def blob_path(self, digest):
+        return os.path.join(self.dir, BLOB_DIR, digest)
+
+    def attach(self, board):
+        self.board = board
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        self.lock.close()
+
+    # Items
+
+    def bind(self, item, uid):
+        self.uids[item] = uid
+        self.items[uid] = item
+        self.next_uid = max(self.next_uid, uid + 1)
+
+    def unbind(self, item):
+        uid = self.uids.pop(item, None)
+        self.items.pop(uid, None)
+
+    def entry(self, item, op, index=None):
+        source = item.source
+        if source.digest is None:
+            source.digest = content_digest(source.full())
+        if index is None:
+            index = self.board.images.index(item)
+        return {
+            "op": op, "uid": self.uids[item], "index": index, "blob": source.digest.hex(),
+            "size": list(source.size), "mode": source.mode, "pos": list(item.pos),
+        }
+
+    def added(self, item):
+        """Change for an item that just landed on the board; stores its image if the hash is new."""
+        self.bind(item, self.next_uid)
+        self.store(item.source)
+        return self.entry(item, "add")
+
+    def removed(self, item):
+        """Change for an item about to be removed; call while it is still on the board."""
+        change = self.entry(item, "remove")
+        self.unbind(item)
+        return change
+
+    def store(self, source):
+        if source.digest is None:
+            source.digest = content_digest(source.full())
+        path = self.blob_path(source.digest.hex())
+        if not os.path.exists(path):
+            data = encode_blob(source)
+            write_atomic(path, lambda f: f.write(data))
+
+    def source(self, change):
+        path = self.blob_path(change["blob"])
+
+        def read():
+            with open(path, "rb") as f:
+                return f.read()
+
+        source = ImageSource.lazy(tuple(change["size"]), change["mode"], lambda: decode(read()), encoded=read)
+        source.digest = bytes.fromhex(change["blob"])
+        return IMAGES.adopt(source)
+
+    # Logging
+
+    def sync(self):
+        geometry = self.board.geometry
+        self.x, self.y = geometry.x.copy(), geometry.y.copy()
+
+    def moves(self, skip):
+        # Journaled items whose geometry changed since the last step
+        geometry = self.board.geometry
+        n = min(len(self.x), len(geometry.x))
+        rows = np.flatnonzero(geometry.alive[:n] & ((geometry.x[:n] != self.x[:n]) | (geometry.y[:n] != self.y[:n])))
+        moves = []
+        for row in rows:
+            uid = self.uids.get(geometry.keys[row])
+            if uid is not None and uid not in skip:
+                moves.append({"op": "move", "uid": uid, "from": [float(self.x[row]), float(self.y[row])], "to": list(geometry.pos(row))})
+        return moves
+
+    def commit(self, changes=()):
+        """Log one user action: `changes` (adds and removes) plus every journaled item it moved."""
+        changes = list(changes)
+        changes += self.moves({change["uid"] for change in changes})
+        self.sync()
+        if not changes:
+            return
+        self.push(changes)
+        self.redo_steps.clear()
+        self.append({"op": "step", "changes": changes})
+
+    def push(self, changes):
+        self.undo_steps.append(changes)
+        del self.undo_steps[:-UNDO_LIMIT]
+
+    def undo(self):
+        """Revert the last step on the board; False if there is none."""
+        if not self.undo_steps:
+            return False
+        changes = self.undo_steps.pop()
+        self.redo_steps.append(changes)
+        self.board.apply_changes(inverse(changes))
+        self.sync()
+        self.append({"op": "undo"})
+        return True
+
+    def redo(self):
+        if not self.redo_steps:
+            return False
+        changes = self.redo_steps.pop()
+        self.push(changes)
+        self.board.apply_changes(changes)
+        self.sync()
+        self.append({"op": "redo"})
+        return True
+
+    def view(self, scale, origin):
+        self.append({"op": "view", "scale": scale, "view": list(origin)})
+
+    def append(self, record):
+        self.file.write(json.dumps(record) + "\n")
+        self.file.flush()
+        self.lines += 1
+        if self.lines >= COMPACT_EVERY:
+            self.checkpoint()
+
+    # Checkpoints
+
+    def checkpoint(self, clear_history=False):
+        """
+        Fold the board into a new checkpoint and start an empty log.
+        Items not yet journaled (e.g. from an opened session) are added here;
+        pastes still loading are left out until they land.
+        """
+        board = self.board
+        if clear_history:
+            self.undo_steps.clear()
+            self.redo_steps.clear()
+            self.uids.clear()
+            self.items.clear()
+        pending = {item for item, _ in board.pending_pastes}
+        items = []
+        for index, item in enumerate(board.images):
+            if item in pending:
+                continue
+            if item not in self.uids:
+                self.bind(item, self.next_uid)
+                self.store(item.source)
+            items.append(self.entry(item, "add", index))
+        self.generation += 1
+        canvas = board.canvas
+        state = {
+            "generation": self.generation, "next_uid": self.next_uid, "scale": board.current_scale,
+            "view": [canvas.canvasx(0), canvas.canvasy(0)] if canvas is not None else [0, 0],
+            "items": items, "undo": self.undo_steps, "redo": self.redo_steps,
+        }
+        write_atomic(self.path(CHECKPOINT_FILE), lambda f: f.write(json.dumps(state).encode()))
+        header = json.dumps({"op": "begin", "generation": self.generation}) + "\n"
+        write_atomic(self.path(JOURNAL_FILE), lambda f: f.write(header.encode()))
+        if self.file is not None:
+            self.file.close()
+        self.file = open(self.path(JOURNAL_FILE), "a")
+        self.lines = 0
+        self.sync()
+        self.collect(items)
+
+    def collect(self, items):
+        # Drop images that neither the board nor the undo history refers to
+        changes = [change for step in self.undo_steps + self.redo_steps for change in step]
+        keep = {change["blob"] for change in items + changes if "blob" in change}
+        for name in os.listdir(os.path.join(self.dir, BLOB_DIR)):
+            if name not in keep and not name.startswith("."):
+                os.unlink(self.blob_path(name))
+
+    def read(self):
+        """(checkpoint or None, records of the matching log)."""
+        try:
+            with open(self.path(CHECKPOINT_FILE), "rb") as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return None, []
+        records = []
+        try:
+            with open(self.path(JOURNAL_FILE)) as f:
+                for line in f:
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        break  # torn last line of a crash
+        except FileNotFoundError:
+            pass
+        if not records or records[0] != {"op": "begin", "generation": state["generation"]}:
+            return state, []
+        return state, records[1:]
+
+    def restore(self):
+        """
+        Rebuild the board from the checkpoint and replay the log onto it.
+        Returns False when there is nothing to restore. Either way the
+        journal is compacted and ready to log.
+        """
+        board = self.board
+        state, records = self.read()
+        if state is None:
+            self.checkpoint()
+            return False
+        self.generation = state["generation"]
+        self.next_uid = state["next_uid"]
+        board.apply_changes(state["items"])
+        self.undo_steps, self.redo_steps = state["undo"], state["redo"]
+        scale, view = state["scale"], state["view"]
+        for record in records:
+            op = record["op"]
+            if op == "step":
+                self.push(record["changes"])
+                self.redo_steps.clear()
+                board.apply_changes(record["changes"])
+            elif op == "undo" and self.undo_steps:
+                changes = self.undo_steps.pop()
+                self.redo_steps.append(changes)
+                board.apply_changes(inverse(changes))
+            elif op == "redo" and self.redo_steps:
+                changes = self.redo_steps.pop()
+                self.push(changes)
+                board.apply_changes(changes)
+            elif op == "view":
+                scale, view = record["scale"], record["view"]
+        board.set_view(scale, view)
+        self.checkpoint()
+        return True
@@ -0,0 +1,126 @@
+import math
+
+SEARCH_GROWTH = 2  # widen the neighbour window by this factor when no free spot was found
+MAX_SEARCH_ROUNDS = 12
+ARRANGE_GAP = 20  # logical pixels between plots in auto-arrange
+
+
+def bbox_at(center, half):
+    # Same convention as ImageItem.get_bbox: centered, integer half extents
+    return (center[0] - half[0], center[1] - half[1], center[0] + half[0], center[1] + half[1])
+
+
+def place_near(index, size, intended, blocking=None):
+    """
+    Center closest to `intended` (Manhattan distance) where a `size` image
+    overlaps nothing in `index` and stays inside the positive quadrant.
+    Candidate columns are the intended x and every x that puts the image flush
+    against a vertical edge of a nearby item; in each column the nearest free
+    y is read off the merged intervals blocked by the items `index.query`
+    returns for that column. The neighbour window grows until a spot inside
+    it is found.
+    `blocking(key)` can exclude index entries that should not count as obstacles.
+    """
+    hw, hh = size[0] // 2, size[1] // 2
+    cx = max(intended[0], hw)
+    cy = max(intended[1], hh)
+    radius = max(size[0], size[1])
+    for _ in range(MAX_SEARCH_ROUNDS):
+        window = (cx - radius - hw, cy - radius - hh, cx + radius + hw, cy + radius + hh)
+        neighbours = [index.bbox(k) for k in index.query(window) if blocking is None or blocking(k)]
+        xs = {cx, hw}
+        for b in neighbours:
+            # Snap flush positions outwards to whole pixels so float edges never overlap by an ulp
+            xs.update((math.ceil(b[2]) + hw, math.floor(b[0]) - hw))
+        best = None
+        for x in sorted(xs, key=lambda x: abs(x - cx)):
+            if x < hw or abs(x - cx) > radius:
+                continue
+            if best is not None and abs(x - cx) >= best[0]:
+                break
+            column = (x - hw, window[1], x + hw, window[3])
+            blockers = [index.bbox(k) for k in index.query(column) if blocking is None or blocking(k)]
+            y = _nearest_free_y(blockers, hh, cy, max(hh, cy - radius), cy + radius)
+            if y is not None and (best is None or abs(x - cx) + abs(y - cy) < best[0]):
+                best = (abs(x - cx) + abs(y - cy), x, y)
+        if best is not None:
+            return (best[1], best[2])
+        radius *= SEARCH_GROWTH
+    return (cx, cy)
+
+
+def _nearest_free_y(column_bboxes, hh, cy, lo, hi):
+    # Centers strictly inside (top - hh, bottom + hh) of an item in the column overlap it
+    blocked = sorted((math.floor(b[1]) - hh, math.ceil(b[3]) + hh) for b in column_bboxes)
+    merged = []
+    for start, end in blocked:
+        if merged and start < merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    for start, end in merged:
+        if start < cy < end:
+            options = [y for y in (start, end) if lo <= y <= hi]
+            return min(options, key=lambda y: abs(y - cy)) if options else None
+    return cy
+
+
+def skyline_pack(sizes, width=None, gap=ARRANGE_GAP):
+    """
+    Bottom-left skyline packing of `sizes` (w, h) into a strip of `width`.
+    Returns one center per size, in input order, all in the positive quadrant.
+    Items are placed tallest first; the skyline stays short (roughly one
+    segment per column), so packing runs in about O(n log n).
+    """
+    if not sizes:
+        return []
+    padded = [(w + gap, h + gap) for w, h in sizes]
+    if width is None:
+        # Aim for a roughly square board
+        area = sum(w * h for w, h in padded)
+        width = int(math.sqrt(area))
+    width = max(width, max(w for w, _ in padded))
+    skyline = [[0, 0, width]]  # segments [x, y, w], left to right, covering [0, width)
+    centers = [None] * len(sizes)
+    for i in sorted(range(len(sizes)), key=lambda i: (-padded[i][1], -padded[i][0])):
+        w, h = padded[i]
+        best = None  # (y, x, start segment)
+        for start in range(len(skyline)):
+            x = skyline[start][0]
+            if x + w > width:
+                break
+            y = 0
+            j = start
+            while j < len(skyline) and skyline[j][0] < x + w:
+                y = max(y, skyline[j][1])
+                j += 1
+            if best is None or (y, x) < best[:2]:
+                best = (y, x, start)
+        y, x, start = best
+        _raise_skyline(skyline, start, x, w, y + h)
+        sw, sh = sizes[i]
+        centers[i] = (x + sw // 2, y + sh // 2)
+    return centers
+
+
+def _raise_skyline(skyline, start, x, w, top):
+    # Replace the span [x, x + w) by one segment at `top`, then merge equal neighbours
+    end = x + w
+    j = start
+    while j < len(skyline) and skyline[j][0] + skyline[j][2] <= end:
+        j += 1
+    tail = []
+    if j < len(skyline) and skyline[j][0] < end:
+        seg = skyline[j]
+        tail = [[end, seg[1], seg[0] + seg[2] - end]]
+        j += 1
+    skyline[start:j] = [[x, top, w]] + tail
+    k = max(start - 1, 0)
+    while k < len(skyline) - 1:
+        if skyline[k][1] == skyline[k + 1][1]:
+            skyline[k][2] += skyline[k + 1][2]
+            del skyline[k + 1]
+        elif k > start:
+            break
+        else:
+            k += 1
@@ -1,13 +1,87 @@
-import tkinter as tk
-from .collage_canvas import CollageCanvas
+import sys
 
 
-def main():
+def gui(session=None, restore=True, watch=(), add=(), data=b""):
+    import tkinter as tk
+    from .collage_canvas import CollageCanvas
+    from .journal import Journal
+    from .server import InstanceServer
+    try:
+        server = InstanceServer()
+    except PermissionError as e:
+        print(f"{e}; this board does not take requests")
+        server = None
+    else:
+        if not server.start():
+            print("Another plot-collage board is running; this one does not take requests")
+            server = None
+    try:
+        journal = Journal()
+    except BlockingIOError as e:
+        print(f"{e}; this board is not autosaved")
+        journal = None
     root = tk.Tk()
     root.title("Plot Collage")
-    app = CollageCanvas(root)
+    app = CollageCanvas(root, journal=journal)
+    if session is not None:
+        app.open_session(path=session)
+    elif restore:
+        app.restore()
+    elif journal is not None:
+        journal.checkpoint(clear_history=True)
+    if watch:
+        app.watch(*watch)
+    for path in add:
+        app.add_file(path)
+    if data:
+        app.add_bytes(data)
+    if server is not None:
+        app.serve(server)
     root.mainloop()
 
 
+def add_open_parser(subparsers):
+    parser = subparsers.add_parser("open", help="open a saved session in the GUI")
+    parser.add_argument("session", help="session file written with Ctrl+S")
+    parser.set_defaults(run=lambda args: gui(args.session) or 0)
+
+
+def add_watch_parser(subparsers):
+    parser = subparsers.add_parser("watch", help="open the GUI and keep the plots of some directories on the board")
+    parser.add_argument("directories", nargs="+", help="directories whose image files are added and reloaded when rewritten")
+    parser.set_defaults(run=lambda args: gui(watch=args.directories) or 0)
+
+
+def add_add_parser(subparsers, data):
+    parser = subparsers.add_parser("add", help="put image files on the running board (or a new one)")
+    parser.add_argument("files", nargs="+", help="image files; - reads one image from stdin")
+    parser.set_defaults(run=lambda args: gui(add=[f for f in args.files if f != "-"], data=data) or 0)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    # A running board takes the request over; only this much is imported before that
+    from .instance import forward, request_for
+    request = request_for(argv)
+    if request is not None:
+        status = forward(*request)
+        if status is not None:
+            return status
+    import argparse
+    from .headless import add_compose_parser
+    parser = argparse.ArgumentParser(prog="plot-collage")
+    subparsers = parser.add_subparsers(dest="command")
+    add_compose_parser(subparsers)
+    add_open_parser(subparsers)
+    add_watch_parser(subparsers)
+    add_add_parser(subparsers, request[2] if request is not None else b"")
+    parser.add_argument("--fresh", action="store_true", help="start with an empty board instead of restoring the autosaved one")
+    args = parser.parse_args(argv)
+    if args.command is None:
+        gui(restore=not args.fresh)
+        return 0
+    return args.run(args)
+
+
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -0,0 +1,170 @@
+import math
+import threading
+from collections import OrderedDict
+from PIL import Image
+from .instrument import TRACER
+
+ZOOM_STEP = 1.1
+BASE_SCALE = 0.25
+RENDER_CACHE_BUDGET = 512 * 1024 * 1024  # bytes of resized pixels kept across all items
+PREVIEW_REDUCING_GAP = 2.0  # previews box-reduce by integer factors before the bilinear pass
+RESAMPLE_SUPPORT = 3  # LANCZOS reads up to this many output pixels beyond a region's edge
+
+
+def zoom_level(scale):
+    # Zoom happens in discrete ZOOM_STEP increments from BASE_SCALE, so snap to that grid
+    return round(math.log(scale / BASE_SCALE, ZOOM_STEP))
+
+
+def level_scale(level):
+    return BASE_SCALE * ZOOM_STEP ** level
+
+
+def resize_region(source, level, region, fast=False):
+    """
+    The pixels of `region` (x0, y0, x1, y1 in the bitmap of `source` at `level`),
+    resampled from only the source pixels underneath it; fast=True gives a
+    preview quality resample. Bypasses the cache: regions follow the viewport
+    and are not worth keeping.
+    """
+    scale = level_scale(level)
+    w, h = int(source.width * scale), int(source.height * scale)
+    fx, fy = source.width / w, source.height / h
+    box = (region[0] * fx, region[1] * fy, region[2] * fx, region[3] * fy)
+    size = (region[2] - region[0], region[3] - region[1])
+    if not source.proxy_covers(scale):
+        # Full resolution: read the box plus the resampling filter's reach, not the whole image
+        pad_x, pad_y = RESAMPLE_SUPPORT * fx, RESAMPLE_SUPPORT * fy
+        crop = (
+            max(0, math.floor(box[0] - pad_x)), max(0, math.floor(box[1] - pad_y)),
+            min(source.width, math.ceil(box[2] + pad_x)), min(source.height, math.ceil(box[3] + pad_y)),
+        )
+        base = expand_palette(source.read_region(crop))
+        box = (box[0] - crop[0], box[1] - crop[1], box[2] - crop[0], box[3] - crop[1])
+    else:
+        base = expand_palette(source.proxy)
+        px, py = base.width / source.width, base.height / source.height
+        box = (box[0] * px, box[1] * py, box[2] * px, box[3] * py)
+    if fast:
+        return base.resize(size, Image.BILINEAR, box=box, reducing_gap=PREVIEW_REDUCING_GAP)
+    return base.resize(size, Image.LANCZOS, box=box)
+
+
+def expand_palette(image):
+    """
+    Palette and bilevel images as the RGB(A)/L pixels they stand for.
+    Pillow resizes "P" and "1" with NEAREST only, so they are expanded
+    right before resampling; stored sources stay compact.
+    """
+    if image.mode == "P":
+        transparent = "transparency" in image.info or image.palette.mode == "RGBA"
+        return image.convert("RGBA" if transparent else "RGB")
+    if image.mode == "1":
+        return image.convert("L")
+    return image
+
+
+def image_nbytes(image):
+    return image.width * image.height * len(image.getbands())
+
+
+class RenderCache:
+    """
+    LRU cache of resized bitmaps keyed by (ImageSource, zoom level), so items
+    showing the same deduplicated content share their renders.
+    Levels of one source form a mipmap pyramid: a missing level is resized
+    from the nearest larger cached level instead of the source pixels.
+    Safe to use from render worker threads; resampling runs outside the lock.
+    """
+
+    def __init__(self, budget=RENDER_CACHE_BUDGET):
+        self.budget = budget
+        self.used = 0
+        self._entries = OrderedDict()  # (source, level) -> image
+        self._levels = {}  # source -> set of cached levels
+        self._lock = threading.RLock()
+
+    def get(self, source, level):
+        key = (source, level)
+        with self._lock:
+            image = self._entries.get(key)
+            if image is not None:
+                self._entries.move_to_end(key)
+            return image
+
+    def put(self, source, level, image):
+        key = (source, level)
+        size = image_nbytes(image)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            if size > self.budget:
+                return
+            self._entries[key] = image
+            self._levels.setdefault(source, set()).add(level)
+            self.used += size
+            while self.used > self.budget:
+                self._remove(next(iter(self._entries)))
+
+    def nearest_larger(self, source, level):
+        with self._lock:
+            larger = [l for l in self._levels.get(source, ()) if l > level]
+            if not larger:
+                return None
+            return self.get(source, min(larger))
+
+    def discard(self, source):
+        with self._lock:
+            for level in list(self._levels.get(source, ())):
+                self._remove((source, level))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._levels.clear()
+            self.used = 0
+
+    def _remove(self, key):
+        image = self._entries.pop(key)
+        self.used -= image_nbytes(image)
+        source, level = key
+        levels = self._levels[source]
+        levels.discard(level)
+        if not levels:
+            del self._levels[source]
+
+    def resized(self, source, level):
+        """Return the ImageSource `source` resized to `level`, building it from the pyramid if needed."""
+        image = self.get(source, level)
+        if image is not None:
+            return image
+        base, size = self._base_for(source, level)
+        if base is None:
+            return None
+        with TRACER.span("resize lanczos", size[0] * size[1] * len(base.getbands())):
+            image = base.resize(size, Image.LANCZOS)
+        self.put(source, level, image)
+        return image
+
+    def preview(self, source, level):
+        """Cheap, uncached resample of `source` to `level` for intermediate zoom steps."""
+        base, size = self._base_for(source, level)
+        if base is None:
+            return None
+        with TRACER.span("resize preview", size[0] * size[1] * len(base.getbands())):
+            return base.resize(size, Image.BILINEAR, reducing_gap=PREVIEW_REDUCING_GAP)
+
+    def _base_for(self, source, level):
+        # Smallest cached level that is still at least as large as the target, else the
+        # source's display proxy (or its full-resolution pixels beyond the proxy's scale)
+        scale = level_scale(level)
+        w, h = int(source.width * scale), int(source.height * scale)
+        if w < 1 or h < 1:
+            return None, None
+        base = self.nearest_larger(source, level)
+        if base is None or base.width < w or base.height < h:
+            base = expand_palette(source.pixels_for(scale))
+        return base, (w, h)
+
+
+CACHE = RenderCache()
@@ -0,0 +1,72 @@
+import os
+import queue
+from concurrent.futures import ThreadPoolExecutor
+from .render_cache import CACHE
+
+RENDER_WORKERS = os.cpu_count() or 4
+POLL_MS = 10  # how often the Tk loop collects finished resamples
+
+
+class RenderPool:
+    """
+    Runs LANCZOS resamples on worker threads (Pillow releases the GIL while resizing).
+    Finished bitmaps are queued and picked up by polling from the Tk loop, where
+    the PhotoImage is created. Items sharing a source share one resample.
+    Every job is tagged with the render generation it was
+    submitted in; results from an older generation (a stale zoom level) are dropped.
+    """
+
+    def __init__(self, widget, workers=RENDER_WORKERS):
+        self.widget = widget
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="render")
+        self.results = queue.SimpleQueue()
+        self.generation = 0
+        self.pending = {}  # item -> (level, generation, future)
+        self.jobs = {}  # (source, level) -> future of the current generation
+        self.poll_job = None
+
+    def next_generation(self):
+        # Called when the zoom level changes: queued work for the old level is obsolete
+        self.generation += 1
+        for _, _, future in self.pending.values():
+            future.cancel()
+        self.pending.clear()
+        self.jobs.clear()
+
+    def submit(self, item, level):
+        pending = self.pending.get(item)
+        if pending is not None and pending[:2] == (level, self.generation):
+            return
+        generation = self.generation
+        future = self.jobs.get((item.source, level))
+        if future is None or future.cancelled():
+            future = self.jobs[(item.source, level)] = self.executor.submit(CACHE.resized, item.source, level)
+        self.pending[item] = (level, generation, future)
+        future.add_done_callback(lambda f: self.results.put((item, level, generation, f)))
+        if self.poll_job is None:
+            self.poll_job = self.widget.after(POLL_MS, self.poll)
+
+    def poll(self):
+        self.poll_job = None
+        while True:
+            try:
+                item, level, generation, future = self.results.get_nowait()
+            except queue.Empty:
+                break
+            pending = self.pending.get(item)
+            if pending is not None and pending[2] is future:
+                del self.pending[item]
+            if self.jobs.get((item.source, level)) is future:
+                del self.jobs[(item.source, level)]
+            if generation != self.generation or future.cancelled():
+                continue
+            if future.exception() is not None:
+                print("Render failed:", future.exception())
+                continue
+            if future.result() is not None:
+                item.finish_render(level, future.result())
+        if self.pending:
+            self.poll_job = self.widget.after(POLL_MS, self.poll)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
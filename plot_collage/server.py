@@ -0,0 +1,76 @@
+import os
+import queue
+import socket
+import threading
+from .instance import CONNECT_TIMEOUT, OK, read_request, socket_path
+
+# Seconds a connection may take to send its request. Connections are served
+# one at a time, so a client that connects and stalls must not hold up the
+# next one for longer than that client's own timeout.
+REQUEST_TIMEOUT = CONNECT_TIMEOUT / 2
+
+
+class InstanceServer:
+    """
+    Listens on the instance socket so later invocations reuse this board.
+    Requests are read and acknowledged on a background thread and queued
+    as (command, paths, payload) in `requests` for the board's Tk loop.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or socket_path()
+        self.requests = queue.Queue()
+        self.sock = None
+        self.thread = threading.Thread(target=self.run, name="instance", daemon=True)
+
+    def start(self):
+        """Listen on the socket; False if another board already does."""
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.bind(self.path)
+        except OSError:
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(self.path)
+            except OSError:
+                # Left behind by a board that did not exit cleanly
+                os.unlink(self.path)
+                sock.bind(self.path)
+            else:
+                probe.close()
+                sock.close()
+                return False
+        os.chmod(self.path, 0o600)
+        sock.listen()
+        self.sock = sock
+        self.thread.start()
+        return True
+
+    def stop(self):
+        sock, self.sock = self.sock, None
+        if sock is not None:
+            sock.close()
+            try:
+                os.unlink(self.path)
+            except FileNotFoundError:
+                pass
+
+    def run(self):
+        while self.sock is not None:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                return  # closed by stop()
+            with conn:
+                conn.settimeout(REQUEST_TIMEOUT)
+                try:
+                    request = read_request(conn.makefile("rb"))
+                except (OSError, ValueError) as e:
+                    reply = f"bad request: {e}".encode()
+                else:
+                    self.requests.put(request)
+                    reply = OK
+                try:
+                    conn.sendall(reply + b"\n")
+                except OSError:
+                    pass  # the client stopped waiting
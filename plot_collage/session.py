@@ -0,0 +1,120 @@
+import io
+import json
+import mmap
+import os
+import tempfile
+from .clipboard import decode
+from .source import IMAGES, ImageSource
+
+SESSION_FORMAT = "plot-collage-session"
+SESSION_VERSION = 1
+SESSION_SUFFIX = ".collage"
+BLOB_SUFFIX = ".blobs"  # image data lives next to the metadata, in <session>.blobs
+PNG_BLOB_MODES = ("1", "L", "LA", "P", "RGB", "RGBA", "I", "I;16")  # anything else is stored as TIFF
+BLOB_COMPRESS_LEVEL = 1  # saving should stay quick; blobs are read back lazily anyway
+
+
+def blob_path(path):
+    return path + BLOB_SUFFIX
+
+
+class BlobFile:
+    """A memory-mapped blob file; `view(offset, length)` slices it without reading the rest."""
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+
+    def view(self, offset, length):
+        return memoryview(self.map)[offset:offset + length]
+
+
+def encode_blob(source):
+    # Blobs read from a session are copied verbatim; everything else is encoded once
+    if source.encoded is not None:
+        return bytes(source.encoded())
+    image = source.full()
+    buf = io.BytesIO()
+    if image.mode in PNG_BLOB_MODES:
+        image.save(buf, "PNG", compress_level=BLOB_COMPRESS_LEVEL)
+    else:
+        image.save(buf, "TIFF")
+    return buf.getvalue()
+
+
+def write_atomic(path, write):
+    # Write next to the target and rename over it: a blob file that is still
+    # memory-mapped by the open session keeps its old inode intact
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), prefix=".plot-collage-")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def save_session(board, path):
+    """
+    Write the board to `path` (JSON layout metadata) and `path`.blobs (one
+    encoded image per distinct source, shared by every item showing it).
+    Pastes still loading are left out.
+    """
+    blobs = {}  # source -> blob entry
+    entries = []
+    images = board.placed_images()
+
+    def write_blobs(f):
+        for img in images:
+            source = img.source
+            if source in blobs:
+                continue
+            data = encode_blob(source)
+            entry = {
+                "offset": f.tell(), "length": len(data), "size": list(source.size), "mode": source.mode,
+                "digest": source.digest.hex() if source.digest else None,
+            }
+            f.write(data)
+            blobs[source] = len(entries)
+            entries.append(entry)
+
+    write_atomic(blob_path(path), write_blobs)
+    view = (board.canvas.canvasx(0), board.canvas.canvasy(0)) if board.canvas is not None else (0, 0)
+    meta = {
+        "format": SESSION_FORMAT,
+        "version": SESSION_VERSION,
+        "scale": board.current_scale,
+        "view": list(view),
+        "blobs": entries,
+        "items": [{"blob": blobs[img.source], "pos": list(img.pos), "idx": img.idx} for img in images],
+    }
+    write_atomic(path, lambda f: f.write(json.dumps(meta, indent=1).encode()))
+
+
+def read_session(path):
+    """
+    Parse `path` and return (metadata, sources), one lazy ImageSource per blob.
+    Nothing is decoded here: each source decodes its slice of the memory-mapped
+    blob file the first time it is rendered or exported.
+    """
+    with open(path, "rb") as f:
+        meta = json.load(f)
+    if meta.get("format") != SESSION_FORMAT:
+        raise ValueError(f"{path} is not a plot-collage session")
+    if meta.get("version", 0) > SESSION_VERSION:
+        raise ValueError(f"{path} was written by a newer version (format {meta['version']})")
+    blob_file = BlobFile(blob_path(path))
+    sources = []
+    for entry in meta["blobs"]:
+        view = lambda entry=entry: blob_file.view(entry["offset"], entry["length"])
+        source = ImageSource.lazy(tuple(entry["size"]), entry["mode"], lambda view=view: decode(view()), encoded=view)
+        if entry.get("digest"):
+            source.digest = bytes.fromhex(entry["digest"])
+            source = IMAGES.adopt(source)
+        sources.append(source)
+    return meta, sources
+
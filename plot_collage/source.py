@@ -0,0 +1,368 @@
+import bisect
+import collections
+import hashlib
+import math
+import os
+import tempfile
+import threading
+import weakref
+import numpy as np
+from PIL import Image
+from .render_cache import CACHE, expand_palette
+
+PROXY_MAX_SCALE = 1 / 3  # zoom up to which rendering works from the display proxy
+SPILL_FULL_RES = True  # keep full-resolution pixels in a temp file instead of RAM
+SPILLABLE_MODES = ("1", "L", "LA", "P", "I", "F", "RGB", "RGBA", "RGBX", "CMYK", "YCbCr")
+HASH_ROWS = 256  # rows hashed per chunk, so hashing never copies a whole large image
+COMPACT_PIXELS = True  # normalize interned images with compact()
+PALETTE_MAX_COLORS = 256
+
+
+class SpillArena:
+    """
+    One anonymous temp file that full-resolution pixel buffers are stored in.
+    Reads use pread, so render workers and the export thread can share it.
+    The range of a source that is gone is `free`d and reused by later writes;
+    free space at the end of the file is truncated away, so the file does
+    not keep growing while rewritten plots replace each other.
+    """
+
+    def __init__(self):
+        self._file = None
+        self._end = 0
+        self._free = []  # sorted (offset, length) ranges below _end that can be reused
+        self._released = collections.deque()  # ranges freed but not yet merged into _free
+        self._lock = threading.Lock()
+
+    def write(self, data):
+        with self._lock:
+            if self._file is None:
+                self._file = tempfile.TemporaryFile(prefix="plot-collage-")
+            self._apply_released()
+            offset = self._allocate(len(data))
+            os.pwrite(self._file.fileno(), data, offset)
+            self._apply_released()
+        return offset
+
+    def _allocate(self, length):
+        # First fit among the free ranges, else append
+        for i, (offset, size) in enumerate(self._free):
+            if size >= length:
+                if size == length:
+                    del self._free[i]
+                else:
+                    self._free[i] = (offset + length, size - length)
+                return offset
+        offset = self._end
+        self._end += length
+        return offset
+
+    def free(self, offset, length):
+        # Sources free their range from a weakref finalizer, i.e. from garbage
+        # collection, which may run in this very thread while it holds the lock
+        # (any allocation in write() can trigger it). The range is queued, and
+        # merged now if the lock is free, else by whoever holds it or writes next.
+        self._released.append((offset, length))
+        if self._lock.acquire(blocking=False):
+            try:
+                self._apply_released()
+            finally:
+                self._lock.release()
+
+    def _apply_released(self):
+        while self._released:
+            offset, length = self._released.popleft()
+            i = bisect.bisect(self._free, (offset, length))
+            # Merge with the neighbouring free ranges
+            if i < len(self._free) and self._free[i][0] == offset + length:
+                length += self._free.pop(i)[1]
+            if i and sum(self._free[i - 1]) == offset:
+                offset, before = self._free.pop(i - 1)
+                length += before
+                i -= 1
+            if offset + length == self._end:
+                self._end = offset
+                os.ftruncate(self._file.fileno(), offset)
+            else:
+                self._free.insert(i, (offset, length))
+
+    def read(self, offset, length):
+        return os.pread(self._file.fileno(), length, offset)
+
+    @property
+    def size(self):
+        """Bytes the spill file currently takes up, free ranges included."""
+        return self._end
+
+
+SPILL = SpillArena()
+
+
+def proxy_size(size, scale):
+    # The size make_proxy() produces, known without decoding anything
+    factor = math.floor(1 / scale) if scale else 1
+    if factor <= 1:
+        return size
+    return (-(-size[0] // factor), -(-size[1] // factor))
+
+
+def make_proxy(image, scale):
+    # Integer box reduction is much cheaper than a resample and keeps at least `scale` of the pixels
+    factor = math.floor(1 / scale) if scale else 1
+    if factor <= 1:
+        return image
+    # reduce() has no bilevel/palette support; averaging needs the expanded colors anyway
+    return expand_palette(image).reduce(factor)
+
+
+_palette_lut = threading.local()
+
+
+def compact(image):
+    """
+    The same pixels in the smallest lossless form: an alpha channel that is
+    opaque everywhere is dropped, and RGB images with at most
+    PALETTE_MAX_COLORS distinct colors (flat-colored plots) become palette
+    images, one byte per pixel instead of three or four.
+    """
+    if image.mode in ("RGBA", "LA") and image.getextrema()[-1] == (255, 255):
+        image = image.convert(image.mode[:-1])
+    if image.mode != "RGB":
+        return image
+    colors = image.getcolors(PALETTE_MAX_COLORS)
+    if colors is None:
+        return image
+    palette = np.array([color for _, color in colors], dtype=np.uint8)
+    # Index every pixel through a 2**24 table keyed by its packed RGB value; only
+    # the entries of this palette are written, so the table stays mostly unpaged
+    lut = getattr(_palette_lut, "table", None)
+    if lut is None:
+        lut = _palette_lut.table = np.empty(1 << 24, dtype=np.uint8)
+    packed = palette.astype(np.uint32)
+    lut[packed[:, 0] | packed[:, 1] << 8 | packed[:, 2] << 16] = np.arange(len(palette))
+    keys = np.asarray(image.convert("RGBX")).view("<u4")[..., 0] & 0xFFFFFF
+    indexed = Image.frombytes("P", image.size, lut[keys].tobytes())
+    indexed.putpalette(palette.tobytes())
+    return indexed
+
+
+class ImageSource:
+    """
+    The pixels behind one ImageItem.
+    Rendering uses a downsampled display proxy up to `proxy_scale`; the
+    full-resolution pixels are only read for export and deep zoom, and live
+    either in RAM, in the spill file, or behind a `loader` that decodes them
+    on demand (see `lazy`).
+    """
+
+    def __init__(self, image, proxy_scale=PROXY_MAX_SCALE, spill=SPILL_FULL_RES):
+        self.width, self.height = image.size
+        self.mode = image.mode
+        self.proxy_scale = proxy_scale
+        self._proxy = make_proxy(image, proxy_scale) if proxy_scale else image
+        self.proxy_size = self._proxy.size
+        self._full = image
+        self._spilled = None  # (offset, length) in SPILL
+        self._palette = None
+        self._lock = threading.Lock()
+        self.loader = None
+        self.encoded = None  # callable returning the encoded file bytes, when the source came from one
+        self.digest = None  # content hash, set when interned in IMAGES
+        if spill and self.spill(image):
+            self._full = None
+            if self._proxy is image:
+                # No proxy was asked for (headless boards); nothing keeps the pixels in RAM
+                self._proxy = None
+
+    @classmethod
+    def lazy(cls, size, mode, loader, proxy_scale=PROXY_MAX_SCALE, encoded=None):
+        """
+        A source of known size and mode whose pixels `loader()` decodes on first
+        use: the proxy when the item is first rendered, the full resolution the
+        first time it is exported or zoomed past the proxy (then spilled, so
+        this happens once). Decoded pixels go through compact() so they match
+        the `mode` an interned source had.
+        """
+        source = cls.__new__(cls)
+        source.width, source.height = size
+        source.mode = mode
+        source.proxy_scale = proxy_scale
+        source._proxy = None
+        source.proxy_size = proxy_size(size, proxy_scale)
+        source._full = None
+        source._spilled = None
+        source._palette = None
+        source._lock = threading.Lock()
+        source.loader = (lambda: compact(loader())) if COMPACT_PIXELS else loader
+        source.encoded = encoded
+        source.digest = None
+        return source
+
+    @property
+    def proxy(self):
+        if self._proxy is None:
+            with self._lock:
+                if self._proxy is None:
+                    image = self.loader() if self.loader is not None else self.full()
+                    self._proxy = make_proxy(image, self.proxy_scale) if self.proxy_scale else image
+        return self._proxy
+
+    @property
+    def loaded(self):
+        return self._proxy is not None
+
+    @property
+    def size(self):
+        return (self.width, self.height)
+
+    @property
+    def nbytes(self):
+        # Decoded size of the full-resolution pixels, wherever they are kept
+        return self.width * self.height * Image.getmodebands(self.mode)
+
+    def spill(self, image):
+        """Move the full-resolution `image` to the spill file; False for modes it cannot hold."""
+        if image.mode != self.mode or image.size != self.size or image.mode not in SPILLABLE_MODES:
+            return False
+        # Spilled palette images need their palette back: (palette mode, palette bytes, transparency)
+        self._palette = (image.palette.mode, image.palette.tobytes(), image.info.get("transparency")) if image.mode == "P" else None
+        data = image.tobytes()
+        self._spilled = (SPILL.write(data), len(data))
+        # The range goes back to the arena once nothing can read this source any more
+        weakref.finalize(self, SPILL.free, *self._spilled)
+        return True
+
+    def full(self):
+        if self._full is not None:
+            return self._full
+        if self._spilled is not None:
+            return self._unspill(self.size, SPILL.read(*self._spilled))
+        if self.proxy_size == self.size and self._proxy is not None:
+            return self._proxy
+        with self._lock:
+            if self._spilled is None:
+                # Decoded once; later exports and deep-zoom regions read the spill file instead
+                image = self.loader()
+                if SPILL_FULL_RES:
+                    self.spill(image)
+                return image
+        return self._unspill(self.size, SPILL.read(*self._spilled))
+
+    def read_region(self, box):
+        """Full-resolution pixels inside the integer `box`, reading no more of the spill file than needed."""
+        if self._full is not None:
+            return self._full.crop(box)
+        if self._spilled is None:
+            return self.full().crop(box)
+        x0, y0, x1, y1 = box
+        if self.mode == "1":
+            # Bilevel rows are bit-packed; read whole rows
+            stride = -(-self.width // 8)
+            rows = SPILL.read(self._spilled[0] + y0 * stride, (y1 - y0) * stride)
+            return Image.frombytes(self.mode, (self.width, y1 - y0), rows).crop((x0, 0, x1, y1 - y0))
+        # One pread per row, covering just the columns of the box
+        pixel = len(Image.new(self.mode, (1, 1)).tobytes())
+        stride = self.width * pixel
+        offset = self._spilled[0] + x0 * pixel
+        rows = b"".join(SPILL.read(offset + y * stride, (x1 - x0) * pixel) for y in range(y0, y1))
+        return self._unspill((x1 - x0, y1 - y0), rows)
+
+    def _unspill(self, size, data):
+        image = Image.frombytes(self.mode, size, data)
+        if self._palette is not None:
+            mode, palette, transparency = self._palette
+            image.putpalette(palette, mode)
+            if transparency is not None:
+                image.info["transparency"] = transparency
+        return image
+
+    def proxy_covers(self, scale):
+        return self.proxy_size[0] >= math.ceil(self.width * scale) and self.proxy_size[1] >= math.ceil(self.height * scale)
+
+    def pixels_for(self, scale):
+        """Smallest stored image that still covers the size at `scale`."""
+        return self.proxy if self.proxy_covers(scale) else self.full()
+
+
+def content_digest(image):
+    # Mode, size, palette and pixels: equal digests mean identical decoded images
+    h = hashlib.blake2b(f"{image.mode} {image.width}x{image.height}".encode(), digest_size=20)
+    if image.mode == "P":
+        h.update(image.palette.tobytes())
+    for top in range(0, image.height, HASH_ROWS):
+        h.update(image.crop((0, top, image.width, min(top + HASH_ROWS, image.height))).tobytes())
+    return h.digest()
+
+
+def normalize(image):
+    """(digest, pixels) of `image` in the form IMAGES stores it: compacted, then hashed."""
+    if COMPACT_PIXELS:
+        image = compact(image)
+    return content_digest(image), image
+
+
+class ImageStore:
+    """
+    Content-addressed, reference-counted table of ImageSources.
+    `intern` compacts and hashes decoded pixels and hands back the existing source for
+    content already on the board, so identical pastes share one proxy, one
+    full-resolution buffer and one set of renders. Items `acquire` and
+    `release` their source; the renders of a source nobody shows are dropped.
+    """
+
+    def __init__(self):
+        self._sources = weakref.WeakValueDictionary()  # digest -> source
+        self._refs = {}  # source -> number of items showing it
+        self._lock = threading.Lock()
+        self.hits = 0  # interns answered with an existing source
+
+    def intern(self, image, digest=None, **options):
+        """
+        Shared ImageSource for the pixels of `image`; safe to call from worker threads.
+        A `digest` means the caller has already compacted and hashed them (headless
+        compose does that in its decode processes).
+        """
+        if digest is None:
+            digest, image = normalize(image)
+        with self._lock:
+            source = self._sources.get(digest)
+            if source is not None:
+                self.hits += 1
+                return source
+        source = ImageSource(image, **options)
+        source.digest = digest
+        with self._lock:
+            # Another thread may have interned the same content meanwhile
+            return self._sources.setdefault(digest, source)
+
+    def adopt(self, source):
+        """Register a source whose `digest` is already known (e.g. from a session file); returns the shared one."""
+        with self._lock:
+            return self._sources.setdefault(source.digest, source)
+
+    def acquire(self, source):
+        with self._lock:
+            self._refs[source] = self._refs.get(source, 0) + 1
+
+    def release(self, source):
+        with self._lock:
+            refs = self._refs.get(source, 0) - 1
+            if refs > 0:
+                self._refs[source] = refs
+                return
+            self._refs.pop(source, None)
+        CACHE.discard(source)
+
+    def stats(self):
+        """(items, distinct sources, bytes saved) over the sources currently shown."""
+        with self._lock:
+            refs = list(self._refs.items())
+        saved = sum((count - 1) * source.nbytes for source, count in refs)
+        return sum(count for _, count in refs), len(refs), saved
+
+
+IMAGES = ImageStore()
+
+
+def as_source(image):
+    return image if isinstance(image, ImageSource) else IMAGES.intern(image)
@@ -0,0 +1,145 @@
+import numpy as np
+
+INITIAL_ROWS = 64  # rows allocated up front; the arrays double when full
+
+
+def rects_overlap(rect1, rect2):
+    return not (rect1[2] <= rect2[0] or rect1[0] >= rect2[2] or rect1[3] <= rect2[1] or rect1[1] >= rect2[3])
+
+
+class GeometryStore:
+    """
+    Item geometry as parallel NumPy arrays: center, integer half extents
+    (the `w // 2` of ImageItem.get_bbox) and z-order, one row per key.
+    Overlap, hit and extent queries are whole-array operations instead of
+    per-item loops. Rows of removed keys are reused by later inserts.
+    Also serves as the spatial index for layout.place_near (`query`/`bbox`).
+    """
+
+    def __init__(self, capacity=INITIAL_ROWS):
+        self.x = np.zeros(capacity)
+        self.y = np.zeros(capacity)
+        self.hw = np.zeros(capacity, dtype=np.int64)
+        self.hh = np.zeros(capacity, dtype=np.int64)
+        self.z = np.full(capacity, -1, dtype=np.int64)  # -1 until the key is drawn
+        self.alive = np.zeros(capacity, dtype=bool)
+        self.keys = [None] * capacity
+        self._rows = {}  # key -> row
+        self._free = list(range(capacity - 1, -1, -1))
+
+    def __len__(self):
+        return len(self._rows)
+
+    def _grow(self):
+        old = len(self.keys)
+        for name in ("x", "y", "hw", "hh", "z", "alive"):
+            array = getattr(self, name)
+            grown = np.full(old * 2, -1 if name == "z" else 0, dtype=array.dtype)
+            grown[:old] = array
+            setattr(self, name, grown)
+        self.keys.extend([None] * old)
+        self._free.extend(range(old * 2 - 1, old - 1, -1))
+
+    def insert(self, key, pos, size):
+        if not self._free:
+            self._grow()
+        row = self._free.pop()
+        self._rows[key] = row
+        self.keys[row] = key
+        self.alive[row] = True
+        self.z[row] = -1
+        self.set_pos(row, pos)
+        self.set_size(row, size)
+        return row
+
+    def remove(self, key):
+        row = self._rows.pop(key, None)
+        if row is None:
+            return
+        self.alive[row] = False
+        self.keys[row] = None
+        self._free.append(row)
+
+    def row(self, key):
+        return self._rows[key]
+
+    def set_pos(self, row, pos):
+        self.x[row], self.y[row] = pos
+
+    def set_size(self, row, size):
+        self.hw[row], self.hh[row] = size[0] // 2, size[1] // 2
+
+    def pos(self, row):
+        return (float(self.x[row]), float(self.y[row]))
+
+    def bbox_of(self, row):
+        x, y, hw, hh = float(self.x[row]), float(self.y[row]), int(self.hw[row]), int(self.hh[row])
+        return (x - hw, y - hh, x + hw, y + hh)
+
+    def bbox(self, key):
+        return self.bbox_of(self._rows[key])
+
+    def _live(self):
+        rows = np.flatnonzero(self.alive)
+        x, y, hw, hh = self.x[rows], self.y[rows], self.hw[rows], self.hh[rows]
+        return rows, x - hw, y - hh, x + hw, y + hh
+
+    def query(self, bbox):
+        """Keys whose bbox overlaps `bbox` (touching edges do not count)."""
+        rows, x0, y0, x1, y1 = self._live()
+        hit = (x0 < bbox[2]) & (x1 > bbox[0]) & (y0 < bbox[3]) & (y1 > bbox[1])
+        return [self.keys[r] for r in rows[hit]]
+
+    def query_point(self, x, y):
+        """Keys whose bbox contains the point, edges included."""
+        rows, x0, y0, x1, y1 = self._live()
+        hit = (x0 <= x) & (x <= x1) & (y0 <= y) & (y <= y1)
+        return [self.keys[r] for r in rows[hit]]
+
+    def topmost_at(self, x, y):
+        """The drawn key with the highest z whose bbox contains the point, or None."""
+        rows, x0, y0, x1, y1 = self._live()
+        hit = (x0 <= x) & (x <= x1) & (y0 <= y) & (y <= y1) & (self.z[rows] >= 0)
+        if not hit.any():
+            return None
+        hits = rows[hit]
+        return self.keys[hits[np.argmax(self.z[hits])]]
+
+    def total_bbox(self):
+        rows, x0, y0, x1, y1 = self._live()
+        if not len(rows):
+            return None
+        return (float(x0.min()), float(y0.min()), float(x1.max()), float(y1.max()))
+
+    def out_of_bounds(self):
+        """Rows whose bbox leaves the positive quadrant."""
+        rows, x0, y0, _, _ = self._live()
+        return rows[(x0 < 0) | (y0 < 0)]
+
+    def overlap_pairs(self):
+        """
+        All overlapping pairs as two row arrays (sort and sweep).
+        Rows are sorted by left edge; the k-th pass compares every row with the
+        row k places later, for as long as any row still has a successor whose
+        left edge lies before its right edge.
+        """
+        rows, x0, y0, x1, y1 = self._live()
+        order = np.argsort(x0, kind="stable")
+        rows, x0, y0, x1, y1 = rows[order], x0[order], y0[order], x1[order], y1[order]
+        # Number of successors that start before each row ends
+        reach = np.searchsorted(x0, x1, side="left") - np.arange(len(rows)) - 1
+        firsts, seconds = [], []
+        for k in range(1, int(reach.max(initial=0)) + 1):
+            i = np.flatnonzero(reach[:-k] >= k) if k < len(rows) else np.empty(0, dtype=np.int64)
+            if not len(i):
+                break
+            j = i + k
+            hit = (x0[j] < x1[i]) & (x1[j] > x0[i]) & (y0[j] < y1[i]) & (y1[j] > y0[i])
+            firsts.append(rows[i[hit]])
+            seconds.append(rows[j[hit]])
+        if not firsts:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        return np.concatenate(firsts), np.concatenate(seconds)
+
+    def has_overlap(self):
+        return len(self.overlap_pairs()[0]) > 0
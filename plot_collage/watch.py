@@ -0,0 +1,93 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from .clipboard import intern_encoded
+from .instrument import traced
+
+WATCH_INTERVAL_S = 1.0  # directory scan period
+WATCH_SETTLE_S = 0.5  # a file must keep its size and mtime this long before it is read
+WATCH_WORKERS = min(4, os.cpu_count() or 1)
+WATCH_EXTENSIONS = (".png", ".jpg", ".jpeg", ".gif", ".bmp", ".tif", ".tiff", ".webp")
+
+
+@traced("load watched file")
+def load_file(path, signature):
+    """
+    Decode `path` into a shared ImageSource on a worker thread, or return
+    None if the file changed while it was read (the next scan retries it).
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+        st = os.fstat(f.fileno())
+    if (st.st_mtime_ns, st.st_size) != signature:
+        return None
+    return intern_encoded(data)
+
+
+class FolderWatcher:
+    """
+    Polls directories for image files on a background thread and decodes
+    new or rewritten ones in a small pool. A file is only read once its
+    size and mtime have held still for WATCH_SETTLE_S, so plots still being
+    written are skipped until they are complete. Results wait in `results`
+    as (path, source or exception) for the Tk loop to pick up.
+    """
+
+    def __init__(self, directories, interval=WATCH_INTERVAL_S, settle=WATCH_SETTLE_S):
+        self.directories = list(directories)
+        self.interval = interval
+        self.settle = settle
+        self.results = queue.Queue()
+        self.executor = ThreadPoolExecutor(max_workers=WATCH_WORKERS, thread_name_prefix="watch")
+        self.seen = {}  # path -> (signature, monotonic time it was first seen with it)
+        self.loaded = {}  # path -> signature last handed to the decode pool
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, name="watch", daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def run(self):
+        while not self.stopped.is_set():
+            self.scan()
+            self.stopped.wait(self.interval)
+
+    def scan(self):
+        now = time.monotonic()
+        for directory in self.directories:
+            try:
+                entries = list(os.scandir(directory))
+            except OSError:
+                continue  # not created yet, or gone for now
+            for entry in entries:
+                if entry.name.startswith(".") or not entry.name.lower().endswith(WATCH_EXTENSIONS):
+                    continue
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+                signature = (st.st_mtime_ns, st.st_size)
+                seen = self.seen.get(entry.path)
+                if seen is None or seen[0] != signature:
+                    self.seen[entry.path] = (signature, now)
+                elif self.loaded.get(entry.path) != signature and now - seen[1] >= self.settle and st.st_size:
+                    self.loaded[entry.path] = signature
+                    self.executor.submit(self.load, entry.path, signature)
+
+    def load(self, path, signature):
+        try:
+            source = load_file(path, signature)
+        except Exception as e:
+            self.results.put((path, e))
+            return
+        if source is None:
+            self.loaded.pop(path, None)
+        else:
+            self.results.put((path, source))
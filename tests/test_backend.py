@@ -0,0 +1,17 @@
+import pytest
+
+from plot_collage.backend import CanvasBackend, RecordingCanvas, TkCanvas
+
+
+def test_backends_implement_the_whole_interface():
+    assert not TkCanvas.__abstractmethods__
+    assert not RecordingCanvas.__abstractmethods__
+
+
+def test_incomplete_backend_fails_when_created():
+    class Partial(CanvasBackend):
+        def create_image(self, x, y, **options):
+            return 1
+
+    with pytest.raises(TypeError, match="make_photo"):
+        Partial()
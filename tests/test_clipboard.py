@@ -0,0 +1,203 @@
+import base64
+import http.server
+import io
+import json
+import threading
+import time
+from concurrent.futures import Future
+
+import pytest
+from PIL import Image
+
+from plot_collage.backend import RecordingCanvas
+from plot_collage.clipboard import HTML_TARGET, choose_target, download, fetch_clipboard_image, image_bytes_from_html
+from plot_collage.collage_canvas import CollageCanvas
+from plot_collage.image_item import ImageItem
+from plot_collage.source import ImageSource
+
+
+def png(color, size=(40, 30)):
+    buf = io.BytesIO()
+    Image.new("RGB", size, color).save(buf, "PNG")
+    return buf.getvalue()
+
+
+class FakeClipboard:
+    available = True
+
+    def __init__(self, contents):
+        self.contents = contents  # target -> bytes
+        self.reads = []
+
+    def targets(self):
+        return ["TARGETS", *self.contents]
+
+    def read(self, target):
+        self.reads.append(target)
+        return self.contents[target]
+
+
+class StandIn(http.server.BaseHTTPRequestHandler):
+    # /plot.png serves PLOT; /big claims a huge Content-Length; /unsized streams
+    # BODY_LIMIT + 1 bytes with no length; /slow answers after SLOW_S
+    PLOT = png((0, 128, 255))
+    SLOW_S = 2.0
+
+    def do_GET(self):
+        if self.path == "/slow":
+            time.sleep(self.SLOW_S)
+        if self.path == "/big":
+            self.send_response(200)
+            self.send_header("Content-Length", str(10**9))
+            self.end_headers()
+            return
+        body = self.PLOT if self.path in ("/plot.png", "/slow") else b"x" * 2048
+        self.send_response(200)
+        if self.path != "/unsized":
+            self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture(scope="module")
+def server():
+    httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), StandIn)
+    httpd.daemon_threads = True
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_choose_target_prefers_images_over_html():
+    assert choose_target(["TARGETS", "text/html", "image/jpeg", "image/png"]) == "image/png"
+    assert choose_target(["TARGETS", "text/html", "image/webp"]) == "image/webp"
+    assert choose_target(["TARGETS", "UTF8_STRING", "text/html"]) == HTML_TARGET
+    assert choose_target(["TARGETS", "UTF8_STRING"]) is None
+
+
+def test_fetch_reads_only_the_chosen_target():
+    clipboard = FakeClipboard({"text/html": b"<p>no</p>", "image/png": png((255, 0, 0))})
+    source = fetch_clipboard_image(clipboard)
+    assert isinstance(source, ImageSource)
+    assert source.size == (40, 30)
+    assert clipboard.reads == ["image/png"]
+
+
+def test_fetch_without_an_image_returns_none():
+    assert fetch_clipboard_image(FakeClipboard({"UTF8_STRING": b"text"})) is None
+    assert fetch_clipboard_image(FakeClipboard({"text/html": b"<p>no image</p>"})) is None
+
+
+def test_fetch_inline_base64_html():
+    data = png((0, 255, 0), (24, 12))
+    html = f'<meta charset="utf-8"><img alt="plot" src="data:image/png;base64,{base64.b64encode(data).decode()}">'
+    source = fetch_clipboard_image(FakeClipboard({"text/html": html.encode()}), opener=None)
+    assert source.size == (24, 12)
+    assert source.encoded() == data
+
+
+def test_fetch_remote_img_from_html(server):
+    html = f'<img src="{server}/plot.png">'
+    source = fetch_clipboard_image(FakeClipboard({"text/html": html.encode()}))
+    assert source.size == (40, 30)
+    assert image_bytes_from_html(html) == StandIn.PLOT
+
+
+def test_download_rejects_a_declared_length_over_the_limit(server):
+    with pytest.raises(ValueError, match="limit"):
+        download(f"{server}/big", max_bytes=1024)
+
+
+def test_download_stops_reading_past_the_limit(server):
+    with pytest.raises(ValueError, match="exceeds"):
+        download(f"{server}/unsized", max_bytes=1024)
+    assert len(download(f"{server}/unsized", max_bytes=4096)) == 2048
+
+
+def test_download_times_out(server):
+    start = time.monotonic()
+    with pytest.raises(OSError):
+        download(f"{server}/slow", timeout=0.2)
+    assert time.monotonic() - start < StandIn.SLOW_S
+
+
+def test_download_uses_the_given_opener():
+    calls = []
+
+    class Response(io.BytesIO):
+        headers = {}
+
+    def opener(url, timeout):
+        calls.append((url, timeout))
+        return Response(b"abc")
+
+    assert download("http://example.invalid/a.png", timeout=3, opener=opener) == b"abc"
+    assert calls == [("http://example.invalid/a.png", 3)]
+
+
+@pytest.fixture
+def board():
+    canvas = RecordingCanvas()
+    board = CollageCanvas(None, backend=canvas)
+    yield board
+    board.pool.shutdown()
+    board.paste_executor.shutdown(wait=False, cancel_futures=True)
+
+
+def test_paste_fills_the_placeholder(board):
+    board.clipboard = FakeClipboard({"image/png": png((255, 0, 0), (300, 200))})
+    board.paste_clipboard_image()
+    assert len(board.images) == 1
+    placeholder = board.images[0]
+    board.canvas.run_until_idle()
+    assert board.pending_pastes == []
+    assert board.images == [placeholder]
+    assert placeholder.source.size == (300, 200)
+
+
+def test_pending_pastes_are_not_exported_or_saved(board, tmp_path):
+    board.images.append(ImageItem(Image.new("RGB", (100, 80), (255, 0, 0)), (50, 40), 0, board.canvas, board.geometry, board.pool))
+    board.add_pending(Future())  # never completes
+    assert len(board.images) == 2
+
+    delivered = []
+    board.deliver_export = lambda data, mime: delivered.append(data)
+    board.copy_collage_to_clipboard()
+    while not board.export_job.done:
+        time.sleep(0.01)
+    board.poll_export()
+    assert Image.open(io.BytesIO(delivered[0])).size == (100, 80)
+
+    path = str(tmp_path / "board.collage")
+    board.save_session(path=path)
+    with open(path) as f:
+        meta = json.load(f)
+    assert [item["pos"] for item in meta["items"]] == [[50.0, 40.0]]
+    assert len(meta["blobs"]) == 1
+
+
+def export(board):
+    delivered = []
+    board.deliver_export = lambda data, mime: delivered.append(data)
+    board.copy_collage_to_clipboard()
+    while not board.export_job.done:
+        time.sleep(0.01)
+    board.poll_export()
+    return Image.open(io.BytesIO(delivered[0])).convert("RGB").getpixel((0, 0))
+
+
+def test_export_cache_follows_swapped_sources(board):
+    item = ImageItem(Image.new("RGB", (60, 40), (0, 0, 0)), (50, 40), 0, board.canvas, board.geometry, board.pool)
+    board.images.append(item)
+    first = id(item.source)
+    assert export(board) == (0, 0, 0)
+    # Rewritten files: replaced sources are freed, and CPython hands their ids out again
+    for shade in range(1, 200):
+        item.set_source(ImageSource(Image.new("RGB", (60, 40), (shade, 0, 0))))
+        if id(item.source) == first:
+            break
+    assert export(board) == (shade, 0, 0)
@@ -0,0 +1,25 @@
+import io
+
+from PIL import Image
+
+from plot_collage.backend import RecordingCanvas
+from plot_collage.collage_canvas import CollageCanvas
+
+
+def png(color, size=(300, 200)):
+    buf = io.BytesIO()
+    Image.new("RGB", size, color).save(buf, "PNG")
+    return buf.getvalue()
+
+
+def test_axes_stay_above_the_composite():
+    board = CollageCanvas(None, backend=RecordingCanvas())
+    board.composite_threshold = 2
+    board.add_bytes(png((255, 0, 0)))
+    board.add_bytes(png((0, 0, 255)))
+    board.canvas.run_until_idle()
+    assert board.composited
+    order = list(board.canvas.items)
+    assert order.index(board.compositor.id) < order.index(board.x_axis_id)
+    assert order.index(board.compositor.id) < order.index(board.y_axis_id)
+    board.close()
@@ -0,0 +1,58 @@
+import os
+import queue
+
+import pytest
+
+from plot_collage import instance
+from plot_collage.backend import RecordingCanvas
+from plot_collage.collage_canvas import SERVER_POLL_MS, CollageCanvas
+from plot_collage.instance import SOCKET_ENV, socket_path
+
+
+@pytest.fixture
+def tmp_root(tmp_path, monkeypatch):
+    # socket_path() with neither override set, rooted in tmp_path instead of /tmp
+    monkeypatch.delenv(SOCKET_ENV, raising=False)
+    monkeypatch.delenv("XDG_RUNTIME_DIR", raising=False)
+    join = os.path.join
+    monkeypatch.setattr(instance.os.path, "join", lambda a, *p: join(str(tmp_path) if a == "/tmp" else a, *p))
+    return tmp_path / f"plot-collage-{os.getuid()}"
+
+
+def test_socket_directory_is_created_private(tmp_root):
+    assert socket_path() == str(tmp_root / "socket")
+    assert os.stat(tmp_root).st_mode & 0o777 == 0o700
+
+
+def test_socket_directory_open_to_others_is_refused(tmp_root):
+    tmp_root.mkdir(mode=0o777)
+    os.chmod(tmp_root, 0o777)
+    with pytest.raises(PermissionError):
+        socket_path()
+
+
+def test_socket_directory_symlink_is_refused(tmp_root, tmp_path):
+    (tmp_path / "elsewhere").mkdir(mode=0o700)
+    tmp_root.symlink_to(tmp_path / "elsewhere")
+    with pytest.raises(PermissionError):
+        socket_path()
+
+
+class Server:
+    def __init__(self):
+        self.requests = queue.Queue()
+
+    def stop(self):
+        pass
+
+
+def test_bad_request_does_not_stop_serving(tmp_path, capsys):
+    board = CollageCanvas(None, backend=RecordingCanvas())
+    board.serve(Server())
+    (tmp_path / "corrupt.collage").write_bytes(b"not a session")
+    for batch in range(2):
+        board.server.requests.put(("open", [str(tmp_path / "missing.collage")], b""))
+        board.server.requests.put(("open", [str(tmp_path / "corrupt.collage")], b""))
+        board.canvas.run_pending(SERVER_POLL_MS)
+    assert capsys.readouterr().out.count("open failed") == 4
+    board.close()
@@ -0,0 +1,200 @@
+import io
+import json
+import os
+
+import pytest
+from PIL import Image
+
+from plot_collage import journal as journal_module
+from plot_collage.backend import RecordingCanvas
+from plot_collage.collage_canvas import CollageCanvas
+from plot_collage.clipboard import decode
+from plot_collage.journal import BLOB_DIR, CHECKPOINT_FILE, JOURNAL_ENV, JOURNAL_FILE, Journal
+from plot_collage.source import normalize
+
+
+class Event:
+    def __init__(self, x, y):
+        self.x = x
+        self.y = y
+
+
+def png(color, size):
+    buf = io.BytesIO()
+    Image.new("RGB", size, color).save(buf, "PNG")
+    return buf.getvalue()
+
+
+RED = png((255, 0, 0), (400, 300))
+BLUE = png((0, 0, 255), (200, 200))
+
+
+@pytest.fixture
+def state(tmp_path, monkeypatch):
+    monkeypatch.setenv(JOURNAL_ENV, str(tmp_path / "state"))
+    return tmp_path / "state"
+
+
+def open_board():
+    board = CollageCanvas(None, backend=RecordingCanvas(), journal=Journal())
+    board.restore()
+    return board
+
+
+def add(board, data):
+    board.add_bytes(data)
+    board.canvas.run_until_idle()
+    return board.images[-1]
+
+
+def move(board, img, pos):
+    # What a right-button drag ends with
+    img.pos = pos
+    board.on_image_release(None)
+
+
+def layout(board):
+    return [(img.idx, img.pos, img.source.size, img.source.digest) for img in board.images]
+
+
+def test_restart_restores_the_board(state):
+    board = open_board()
+    add(board, RED)
+    add(board, BLUE)
+    move(board, board.images[1], (2000.0, 1500.0))
+    move(board, board.images[0], (900.0, 700.0))
+    before = layout(board)
+    board.close()
+
+    board = open_board()
+    assert layout(board) == before
+    board.close()
+    # Each image is stored once, under the hash of the pixels it decodes to
+    blobs = sorted(os.listdir(state / BLOB_DIR))
+    assert blobs == sorted(digest.hex() for *_, digest in before)
+    for name in blobs:
+        digest, _ = normalize(decode((state / BLOB_DIR / name).read_bytes()))
+        assert digest.hex() == name
+
+
+def test_undo_and_redo_survive_a_restart(state):
+    board = open_board()
+    red = add(board, RED)
+    blue = add(board, BLUE)
+    start = blue.pos
+    move(board, blue, (3000.0, 3000.0))
+    board.undo()
+    assert blue.pos == start
+    board.close()
+
+    board = open_board()
+    red, blue = board.images
+    assert blue.pos == start
+    board.redo()
+    assert blue.pos == (3000.0, 3000.0)
+    board.undo()
+    board.undo()  # the add of blue
+    assert [img.source.size for img in board.images] == [(400, 300)]
+    board.close()
+
+    board = open_board()
+    assert [img.source.size for img in board.images] == [(400, 300)]
+    board.redo()
+    assert [img.source.size for img in board.images] == [(400, 300), (200, 200)]
+    board.close()
+
+
+def test_delete_is_undone_in_place(state):
+    board = open_board()
+    add(board, RED)
+    blue = add(board, BLUE)
+    add(board, RED)
+    x, y = blue.pos
+    board.delete_image_at(Event(x * board.current_scale, y * board.current_scale))
+    assert [img.idx for img in board.images] == [0, 1]
+    board.undo()
+    assert [img.source.size for img in board.images] == [(400, 300), (200, 200), (400, 300)]
+    assert [img.idx for img in board.images] == [0, 1, 2]
+    assert board.images[1].pos == (x, y)
+    board.close()
+
+
+def test_log_of_an_older_generation_is_ignored(state):
+    board = open_board()
+    add(board, RED)
+    board.journal.checkpoint()
+    add(board, BLUE)
+    board.close()
+    # A crash after the new checkpoint was written but before its log replaced the old one
+    with open(state / JOURNAL_FILE) as f:
+        lines = f.readlines()
+    header = json.loads(lines[0])
+    header["generation"] -= 1
+    lines[0] = json.dumps(header) + "\n"
+    with open(state / JOURNAL_FILE, "w") as f:
+        f.writelines(lines)
+
+    board = open_board()
+    assert [img.source.size for img in board.images] == [(400, 300)]
+    board.close()
+
+
+def test_torn_last_line_is_dropped(state):
+    board = open_board()
+    red = add(board, RED)
+    move(board, red, (1000.0, 1000.0))
+    board.close()
+    with open(state / JOURNAL_FILE, "a") as f:
+        f.write('{"op": "step", "changes": [{"op": "mo')
+
+    board = open_board()
+    assert [img.pos for img in board.images] == [(1000.0, 1000.0)]
+    # The restored board is checkpointed, so the torn tail is gone for good
+    with open(state / JOURNAL_FILE) as f:
+        assert [json.loads(line)["op"] for line in f] == ["begin"]
+    board.close()
+
+
+def test_compaction_keeps_undo_history(state, monkeypatch):
+    monkeypatch.setattr(journal_module, "COMPACT_EVERY", 4)
+    board = open_board()
+    red = add(board, RED)
+    for i in range(1, 10):
+        move(board, red, (1000.0 + 100 * i, 1000.0))
+    generation = board.journal.generation
+    board.close()
+
+    board = open_board()
+    assert board.journal.generation > generation
+    (red,) = board.images
+    assert red.pos == (1900.0, 1000.0)
+    board.undo()
+    board.undo()
+    assert red.pos == (1700.0, 1000.0)
+    board.close()
+
+
+def test_unreferenced_blobs_are_collected(state):
+    board = open_board()
+    add(board, RED)
+    add(board, BLUE)
+    board.undo()
+    assert len(os.listdir(state / BLOB_DIR)) == 2  # blue can still be redone
+    board.journal.checkpoint(clear_history=True)
+    assert len(os.listdir(state / BLOB_DIR)) == 1
+    board.close()
+
+
+def test_second_window_cannot_take_the_journal(state):
+    board = open_board()
+    with pytest.raises(BlockingIOError):
+        Journal()
+    board.close()
+    Journal().close()
+
+
+def test_missing_checkpoint_starts_empty(state):
+    board = open_board()
+    assert board.images == []
+    assert (state / CHECKPOINT_FILE).exists()
+    board.close()
@@ -0,0 +1,32 @@
+import threading
+
+from plot_collage.source import SpillArena
+
+
+def test_spill_ranges_are_reused_and_the_tail_truncated():
+    arena = SpillArena()
+    a = arena.write(b"a" * 100)
+    b = arena.write(b"b" * 50)
+    arena.write(b"c" * 10)
+    arena.free(a, 100)
+    assert arena.write(b"d" * 60) == a
+    assert arena.read(a, 60) == b"d" * 60
+    assert arena.read(b, 50) == b"b" * 50
+    assert arena.size == 160
+    arena.free(150, 10)
+    arena.free(b, 50)
+    assert arena.size == 60
+
+
+def test_free_while_the_lock_is_held_does_not_block():
+    # What a source collected by the garbage collector in the middle of write() does
+    arena = SpillArena()
+    offset = arena.write(b"x" * 100)
+    with arena._lock:
+        freeing = threading.Thread(target=arena.free, args=(offset, 100))
+        freeing.start()
+        freeing.join(timeout=5)
+        assert not freeing.is_alive()
+    assert arena.size == 100  # applied by the next write
+    assert arena.write(b"y" * 10) == 0
+    assert arena.size == 10